@@ -0,0 +1,115 @@
+"""
+Synthetic translation corpus: the same documents in several locales, the first locale is the base.
+
+Every locale directory holds ``files`` markdown documents and as many android style xml string files. A part of
+the translations (``error_rate``) differs from the base in structure or java arguments so the comparators have
+something to report.
+"""
+import random
+from pathlib import Path
+
+WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do', 'eiusmod',
+         'tempor', 'über', 'ĉiuj', '拥有最新版本', 'magna', 'aliqua']
+LOCALES = ['en', 'de', 'fr', 'es', 'it', 'pt', 'ru', 'ja', 'ko', 'zh', 'nl', 'sv', 'pl', 'tr', 'ar', 'he']
+
+
+def locales(count):
+    return [LOCALES[i] if i < len(LOCALES) else 'l%02d' % i for i in range(count)]
+
+
+class Corpus(object):
+    def __init__(self, directory, locales, files):
+        self.directory = Path(directory)
+        self.locales = locales
+        self.files = files
+
+    @property
+    def base_locale(self):
+        return self.locales[0]
+
+    def pattern(self, suffix):
+        return str(self.directory.joinpath('{lang}', '*.' + suffix))
+
+    def rows(self, suffix):
+        names = ['doc%04d.%s' % (i, suffix) for i in range(self.files)]
+        return [[self.directory.joinpath(locale, name) for locale in self.locales] for name in names]
+
+    def paths(self, suffix):
+        return [path for row in self.rows(suffix) for path in row]
+
+
+class _Generator(object):
+    def __init__(self, rnd, paragraphs, words, link_density, base_url, unique_urls):
+        self.rnd = rnd
+        self.paragraphs = paragraphs
+        self.words = words
+        self.link_density = link_density
+        self.base_url = base_url
+        self.unique_urls = unique_urls
+
+    def _url(self):
+        number = self.rnd.randrange(self.unique_urls)
+        # one url in ten leads to a missing page
+        status = 'missing' if number % 10 == 0 else 'ok'
+        return '{}/{}/{}'.format(self.base_url, status, number)
+
+    def _sentence(self):
+        tokens = []
+        for _ in range(self.words):
+            if self.rnd.random() < self.link_density:
+                tokens.append('[{}]({})'.format(self.rnd.choice(WORDS), self._url()))
+            else:
+                tokens.append(self.rnd.choice(WORDS))
+        return ' '.join(tokens) + '.'
+
+    def structure(self):
+        """
+        Kinds of the markdown blocks of a document (heading, paragraph or list), shared by all locales.
+        """
+        return [self.rnd.choice(['#', '##', '', '', '-']) for _ in range(self.paragraphs)]
+
+    def markdown(self, structure, broken):
+        blocks = []
+        for kind in structure:
+            if kind == '-':
+                blocks.append('\n'.join('- ' + self._sentence() for _ in range(3)))
+            elif kind:
+                blocks.append('{} {}'.format(kind, self._sentence()))
+            else:
+                blocks.append(self._sentence())
+        if broken and len(blocks) > 1:
+            # a missing heading or paragraph changes the structure of the translation
+            del blocks[self.rnd.randrange(len(blocks))]
+        return '\n\n'.join(blocks) + '\n'
+
+    def strings(self, keys, broken):
+        lines = ['<?xml version="1.0" encoding="utf-8"?>', '<resources>']
+        for key, args in keys:
+            if broken and args:
+                args = args[1:]
+            text = ' '.join([self._sentence()] + list(args))
+            lines.append('    <string name="{}">{}</string>'.format(key, text))
+        lines.append('</resources>')
+        return '\n'.join(lines) + '\n'
+
+
+def generate(directory, locale_count=5, files=20, paragraphs=10, words=30, link_density=0.05, error_rate=0.1,
+             base_url='http://127.0.0.1:8000', unique_urls=200, seed=0):
+    """
+    Writes the corpus to ``directory`` and returns a ``Corpus`` describing it.
+    """
+    rnd = random.Random(seed)
+    generator = _Generator(rnd, paragraphs, words, link_density, base_url, unique_urls)
+    corpus = Corpus(directory, locales(locale_count), files)
+    for locale in corpus.locales:
+        corpus.directory.joinpath(locale).mkdir(parents=True, exist_ok=True)
+
+    for i in range(files):
+        structure = generator.structure()
+        keys = [('key%d' % k, rnd.choice([(), ('%s', ), ('%1$s', '%2$d')])) for k in range(paragraphs)]
+        for locale in corpus.locales:
+            broken = locale != corpus.base_locale and rnd.random() < error_rate
+            directory = corpus.directory.joinpath(locale)
+            directory.joinpath('doc%04d.md' % i).write_text(generator.markdown(structure, broken), encoding='utf-8')
+            directory.joinpath('doc%04d.xml' % i).write_text(generator.strings(keys, broken), encoding='utf-8')
+    return corpus
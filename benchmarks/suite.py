@@ -0,0 +1,242 @@
+"""
+Throughput of the parsers, url extractors, comparators, reporters and the url checker on a synthetic corpus.
+
+    python -m benchmarks [--locales 5] [--files 20] [--paragraphs 10] [--link-density 0.05]
+                         [--repeat 3] [--only NAME] [--output results.json] [--baseline previous.json]
+
+Results are printed (or written to ``--output``) as json together with the versions of the libraries the
+validator depends on. With ``--baseline`` every benchmark also gets the time of the previous run and the ratio
+between the two, ratios above 1 are slower than the baseline.
+"""
+import sys
+import json
+import shutil
+import timeit
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+try:
+    from importlib.metadata import version as _version, PackageNotFoundError
+except ImportError:
+    # python < 3.8
+    import pkg_resources
+
+    def _version(name):
+        return pkg_resources.get_distribution(name).version
+
+    PackageNotFoundError = pkg_resources.DistributionNotFound
+
+from validator import fs
+from validator.parsers import (ChainParser, MarkdownParser, XmlParser, LxmlXmlParser, FileReader, BulkFileReader,
+                               TxtReader)
+from validator.checks import MarkdownComparator, JavaComparator
+from validator.checks.url import (UrlValidator, TextUrlExtractor, CompiledTextUrlExtractor, HtmlUrlExtractor,
+                                  StreamingHtmlUrlExtractor)
+from validator.reports import HtmlReporter, TemplateHtmlReporter
+
+from . import corpus as corpus_module
+from .server import StubServer
+
+DEPENDENCIES = ['sdiff', 'Markdown', 'beautifulsoup4', 'lxml', 'aiohttp']
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """
+    Registers a benchmark. The decorated function prepares everything that shouldn't be measured and returns
+    a callable running the measured part once together with the number of items it processes.
+    """
+    def decorator(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return decorator
+
+
+def _contents(paths):
+    return [fs.read_content(path) for path in paths]
+
+
+@benchmark('fs.files')
+def bench_files(context):
+    pattern = context.corpus.pattern('md')
+    return lambda: list(fs.files(pattern, lang=context.corpus.base_locale)), len(context.corpus.paths('md'))
+
+
+@benchmark('reader.file')
+def bench_file_reader(context):
+    rows = context.corpus.rows('md')
+    reader = FileReader()
+    return lambda: [[reader.read(path) for path in row] for row in rows], len(context.corpus.paths('md'))
+
+
+@benchmark('reader.bulk')
+def bench_bulk_reader(context):
+    rows = context.corpus.rows('md')
+    reader = BulkFileReader()
+    return lambda: [[reader.read(path) for path in row] for row in reader.prefetch(rows)], \
+        len(context.corpus.paths('md'))
+
+
+@benchmark('parser.markdown')
+def bench_markdown_parser(context):
+    contents = _contents(context.corpus.paths('md'))
+    parser = ChainParser([MarkdownParser()])
+    return lambda: [parser.parse(content) for content in contents], len(contents)
+
+
+def _xml_parser_benchmark(xml_parser):
+    def setup(context):
+        contents = _contents(context.corpus.paths('xml'))
+        parser = ChainParser([xml_parser])
+        return lambda: [parser.parse(content) for content in contents], len(contents)
+    return setup
+
+
+benchmark('parser.xml')(_xml_parser_benchmark(XmlParser()))
+benchmark('parser.xml.lxml')(_xml_parser_benchmark(LxmlXmlParser()))
+
+
+def _extractor_benchmark(extractor, html):
+    def setup(context):
+        contents = _contents(context.corpus.paths('md'))
+        if html:
+            contents = [MarkdownParser().parse(content) for content in contents]
+        return lambda: [extractor.extract_urls(content) for content in contents], len(contents)
+    return setup
+
+
+benchmark('extractor.txt.default')(_extractor_benchmark(TextUrlExtractor(), html=False))
+benchmark('extractor.txt.fast')(_extractor_benchmark(CompiledTextUrlExtractor(), html=False))
+benchmark('extractor.html.default')(_extractor_benchmark(HtmlUrlExtractor(), html=True))
+benchmark('extractor.html.fast')(_extractor_benchmark(StreamingHtmlUrlExtractor(), html=True))
+
+
+def _pairs(rows):
+    return sum(len(row) - 1 for row in rows)
+
+
+@benchmark('check.markdown')
+def bench_markdown_comparator(context):
+    rows = context.corpus.rows('md')
+    parser, reader = ChainParser([]), FileReader()
+    return lambda: MarkdownComparator().check(rows, parser, reader), _pairs(rows)
+
+
+@benchmark('check.java')
+def bench_java_comparator(context):
+    rows = context.corpus.rows('xml')
+    parser, reader = ChainParser([XmlParser()]), FileReader()
+    return lambda: JavaComparator().check(rows, parser, reader), _pairs(rows)
+
+
+def _reporter_benchmark(reporter_class):
+    def setup(context):
+        errors = MarkdownComparator().check(context.corpus.rows('md'), ChainParser([]), FileReader())
+        reporter = reporter_class(str(context.directory.joinpath('errors')))
+        return lambda: reporter.report(errors), len(errors)
+    return setup
+
+
+benchmark('report.html')(_reporter_benchmark(HtmlReporter))
+benchmark('report.html.template')(_reporter_benchmark(TemplateHtmlReporter))
+
+
+@benchmark('check.url')
+def bench_url_checker(context):
+    contents = _contents(context.corpus.paths('md'))
+    # every locale links to the same pages, the checker requests each of them once
+    rows = [[content] for content in contents]
+    check = UrlValidator('html', max_concurrency=context.args.url_concurrency)
+    parser = ChainParser([MarkdownParser()])
+    urls = set()
+    for content in contents:
+        urls.update(check.extractor.extract_urls(parser.parse(content)))
+    return lambda: check.check(rows, parser, TxtReader()), len(urls)
+
+
+def _versions():
+    versions = {'python': platform.python_version()}
+    for name in DEPENDENCIES:
+        try:
+            versions[name] = _version(name)
+        except PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+class Context(object):
+    def __init__(self, args, directory, corpus):
+        self.args = args
+        self.directory = directory
+        self.corpus = corpus
+
+
+def run(context, names=None):
+    results = {}
+    for name, setup in BENCHMARKS:
+        if names and not any(selected in name for selected in names):
+            continue
+        measured, items = setup(context)
+        seconds = min(timeit.repeat(measured, number=1, repeat=context.args.repeat))
+        results[name] = {
+            'seconds': seconds,
+            'items': items,
+            'items_per_second': items / seconds if seconds else None,
+        }
+    return results
+
+
+def compare(results, baseline):
+    for name, result in results.items():
+        previous = baseline.get('benchmarks', {}).get(name)
+        if previous and previous.get('seconds'):
+            result['baseline_seconds'] = previous['seconds']
+            result['ratio'] = result['seconds'] / previous['seconds']
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--locales', type=int, default=5)
+    arg_parser.add_argument('--files', type=int, default=20)
+    arg_parser.add_argument('--paragraphs', type=int, default=10)
+    arg_parser.add_argument('--words', type=int, default=30, help='words in a sentence')
+    arg_parser.add_argument('--link-density', type=float, default=0.05, help='chance of a word being a link')
+    arg_parser.add_argument('--error-rate', type=float, default=0.1, help='share of broken translations')
+    arg_parser.add_argument('--unique-urls', type=int, default=200)
+    arg_parser.add_argument('--url-concurrency', type=int, default=50)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--only', action='append', help='run benchmarks with NAME in their name')
+    arg_parser.add_argument('--output', help='write the results to a file instead of stdout')
+    arg_parser.add_argument('--baseline', help='results of a previous run to compare with')
+    args = arg_parser.parse_args(argv)
+
+    directory = Path(tempfile.mkdtemp(prefix='validator-bench-'))
+    try:
+        with StubServer() as server:
+            corpus = corpus_module.generate(directory.joinpath('corpus'), locale_count=args.locales,
+                                            files=args.files, paragraphs=args.paragraphs, words=args.words,
+                                            link_density=args.link_density, error_rate=args.error_rate,
+                                            base_url=server.url, unique_urls=args.unique_urls, seed=args.seed)
+            results = run(Context(args, directory, corpus), args.only)
+    finally:
+        shutil.rmtree(str(directory), ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            compare(results, json.load(fp))
+    corpus_args = ['locales', 'files', 'paragraphs', 'words', 'link_density', 'error_rate', 'unique_urls', 'seed']
+    report = {
+        'versions': _versions(),
+        'corpus': {name: getattr(args, name) for name in corpus_args},
+        'benchmarks': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    return 0
@@ -0,0 +1,66 @@
+"""
+Compares CompiledTextUrlExtractor with TextUrlExtractor: both have to find the same urls in every document.
+
+    python -m benchmarks.url_extractors [--documents 2000] [--repeat 3]
+"""
+import sys
+import json
+import random
+import argparse
+import timeit
+
+from validator.checks.url import TextUrlExtractor, CompiledTextUrlExtractor
+
+WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'über', '拥有最新版本', 'ĉiuj', '(note)', 'end.', 'a,b']
+URLS = [
+    'http://www.google.com', 'https://support.getkeepsafe.com/hc/en-us/articles/204055700?id=1',
+    'www.example.com/path_(with)_parens', 'http://bit.ly/UpdateKeepSafe。拥有', 'http://{{ticket.url}},',
+    'http://domain.com/{param}/x', 'www2.example.org.', 'http://www.google¡.com', '!keepsafe://access.ks.com/x',
+    'keepsafe://access.getkeepsafe.com/upgrade', 'support@getkeepsafe.com', 'http://',
+]
+
+
+def generate_documents(count, words=200, link_density=0.02, seed=0):
+    rnd = random.Random(seed)
+    documents = []
+    for _ in range(count):
+        tokens = [rnd.choice(URLS) if rnd.random() < link_density else rnd.choice(WORDS) for _ in range(words)]
+        documents.append(' '.join(tokens))
+    return documents
+
+
+def check_parity(documents, reference, candidate):
+    mismatches = []
+    for document in documents:
+        if sorted(reference.extract_urls(document)) != sorted(candidate.extract_urls(document)):
+            mismatches.append(document)
+    return mismatches
+
+
+def measure(extractor, documents, repeat):
+    return min(timeit.repeat(lambda: [extractor.extract_urls(d) for d in documents], number=1, repeat=repeat))
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--documents', type=int, default=2000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    # half of the documents have no links at all, like most strings in csv and xml exports
+    documents = generate_documents(args.documents // 2) + generate_documents(args.documents // 2, link_density=0)
+    reference, candidate = TextUrlExtractor(), CompiledTextUrlExtractor()
+    mismatches = check_parity(documents, reference, candidate)
+    result = {
+        'documents': len(documents),
+        'mismatches': len(mismatches),
+        'regex_seconds': measure(reference, documents, args.repeat),
+        'compiled_seconds': measure(candidate, documents, args.repeat),
+    }
+    json.dump(result, sys.stdout, indent=2)
+    print()
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
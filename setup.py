@@ -13,7 +13,6 @@ install_requires = [
     'sdiff @ git+https://github.com/KeepSafe/html-structure-diff.git@0.4.1#egg=sdiff',
     'aiohttp >=3, <3.4',
     'Markdown',
-    'parse <= 1.8.2',
     'beautifulsoup4 >=4, <5',
     'lxml >=3',
 ]
@@ -40,7 +39,7 @@ setup(
     author_email='support@getkeepsafe.com',
     url='https://github.com/KeepSafe/content-validator/',
     license='Apache',
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     package_data={},
     namespace_packages=[],
     install_requires=install_requires,
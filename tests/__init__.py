@@ -1,6 +1,6 @@
 import asyncio
 from unittest import TestCase
-from unittest.mock import Mock
+from unittest.mock import Mock, MagicMock
 
 
 class AsyncTestCase(TestCase):
@@ -26,6 +26,14 @@ class AsyncMock(Mock):
         return iter([])
 
 
+def response(status, **kwargs):
+    """
+    Mocked aiohttp response, without a content length the body isn't read.
+    """
+    kwargs.setdefault('content_length', None)
+    return MagicMock(status=status, **kwargs)
+
+
 class AsyncContext(Mock):
     def __init__(self, *args, context=None, **kwargs):
         super().__init__(*args, **kwargs)
@@ -0,0 +1,126 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+from pathlib import Path
+import tempfile
+import sys
+import shutil
+
+from validator.cache import ContentStore, LruCache, UrlStatusCache
+from validator.checks import ChainCheck, JavaComparator, MarkdownComparator
+from validator.parsers import ChainParser, FileReader
+
+
+class TestContentStore(TestCase):
+    def setUp(self):
+        self.reader = MagicMock()
+        self.reader.read.side_effect = lambda path: 'content of %s' % path
+        self.parser = MagicMock()
+        self.parser.parse.side_effect = lambda content: content.upper()
+
+    def test_parse_once(self):
+        store = ContentStore(self.reader, self.parser)
+
+        self.assertEqual('CONTENT OF A', store.read('a'))
+        self.assertEqual('CONTENT OF A', store.read('a'))
+
+        self.assertEqual(1, self.parser.parse.call_count)
+        self.assertEqual(1, store.hits)
+        self.assertEqual(1, store.misses)
+
+    def test_parse_is_noop(self):
+        store = ContentStore(self.reader, self.parser)
+
+        self.assertEqual('aaa', store.parse('aaa'))
+
+    def test_evict_least_recently_used(self):
+        store = ContentStore(self.reader, self.parser, max_size=2 * sys.getsizeof('CONTENT OF A'))
+        store.read('a')
+        store.read('b')
+        store.read('a')
+        store.read('c')
+        store.read('a')
+        store.read('b')
+
+        self.assertEqual(2, store.stats()['entries'])
+        self.assertEqual(2, store.hits)
+        self.assertEqual(4, store.misses)
+
+    def test_skip_content_over_limit(self):
+        store = ContentStore(self.reader, self.parser, max_size=1)
+        store.read('a')
+
+        self.assertEqual(0, store.stats()['entries'])
+        self.assertEqual(0, store.size)
+
+    def test_reparse_modified_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = Path(directory, 'test.txt')
+        path.write_text('aaa')
+        store = ContentStore(FileReader(), ChainParser([]))
+
+        self.assertEqual('aaa', store.read(path))
+        path.write_text('bbbb')
+
+        self.assertEqual('bbbb', store.read(path))
+        self.assertEqual(2, store.misses)
+
+
+class TestChainCheckStore(TestCase):
+    def test_read_once_for_all_checks(self):
+        reader = MagicMock(spec=['read'])
+        reader.read.side_effect = lambda path: '# %s' % path
+        parser = ChainParser([])
+        check = ChainCheck([MarkdownComparator(), JavaComparator()])
+
+        check.check(iter([['base', 'other']]), parser, reader)
+
+        self.assertEqual(2, reader.read.call_count)
+        self.assertEqual(2, check.store.hits)
+
+
+class TestLruCache(TestCase):
+    def test_keep_recently_used(self):
+        cache = LruCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(1, cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(2, len(cache))
+
+
+class TestUrlStatusCache(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = Path(directory, 'urls.sqlite')
+
+    def test_persist_between_instances(self):
+        cache = UrlStatusCache(self.path)
+        cache.set('http://www.google.com', 200)
+        cache.close()
+
+        self.assertEqual(200, UrlStatusCache(self.path).get('http://www.google.com'))
+
+    def test_missing_url(self):
+        cache = UrlStatusCache(self.path)
+
+        self.assertIsNone(cache.get('http://www.google.com'))
+        self.assertEqual(1, cache.misses)
+
+    def test_expire_failures_separately(self):
+        cache = UrlStatusCache(self.path, success_ttl=60, failure_ttl=0)
+        cache.set('http://www.google.com', 200)
+        cache.set('http://www.google.com/missing', 404)
+
+        self.assertEqual(200, cache.get('http://www.google.com'))
+        self.assertIsNone(cache.get('http://www.google.com/missing'))
+
+    def test_force_refresh(self):
+        cache = UrlStatusCache(self.path, force_refresh=True)
+        cache.set('http://www.google.com', 200)
+
+        self.assertIsNone(cache.get('http://www.google.com'))
@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+from validator.checks import java
+from validator.parsers import ChainParser, XmlParser, TxtReader
+
+
+class TestJavaComparator(TestCase):
+    base = '<resources><string name="a">%s files</string><string name="b">%1$d of %2$d</string></resources>'
+
+    def _check(self, other, key=None):
+        parser = ChainParser([XmlParser('string', key=key)])
+        return java.JavaComparator().check([[self.base, other]], parser, TxtReader())
+
+    def test_args_match(self):
+        other = '<resources><string name="a">%s Dateien</string><string name="b">%1$d von %2$d</string></resources>'
+        self.assertEqual([], self._check(other))
+        self.assertEqual([], self._check(other, key='name'))
+
+    def test_entries_compared_by_name(self):
+        # the args of the whole file match but not the ones of each string
+        other = '<resources><string name="a">%s Dateien %1$d</string><string name="b">%2$d</string></resources>'
+        self.assertEqual([], self._check(other))
+
+        errors = self._check(other, key='name')
+
+        self.assertEqual(['%s Dateien %1$d', '%2$d'], [error.other.parsed for error in errors])
+        self.assertEqual(['a: java args do not match', 'b: java args do not match'], [e.error_msgs for e in errors])
+        # the errors point to the files, not to the texts of the entries
+        self.assertEqual([(self.base, other)] * 2, [(e.base.original, e.other.original) for e in errors])
+
+    def test_missing_entries_skipped(self):
+        other = '<resources><string name="a">%s Dateien</string></resources>'
+        self.assertEqual([], self._check(other, key='name'))
+
+    def test_duplicate_entries_compared(self):
+        base = '<resources><string name="a">%s files</string><string name="a">%d files</string></resources>'
+        other = '<resources><string name="a">%s Dateien</string><string name="a">Dateien</string></resources>'
+        parser = ChainParser([XmlParser('string', key='name')])
+
+        errors = java.JavaComparator().check([[base, other]], parser, TxtReader())
+
+        self.assertEqual(['Dateien'], [error.other.parsed for error in errors])
+        self.assertEqual(['a#2: java args do not match'], [error.error_msgs for error in errors])
@@ -1,7 +1,9 @@
 from unittest import TestCase, skip
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
+import pickle
 
 from validator.checks import md
+from validator.parsers import Entries, TxtReader
 
 from tests.utils import read
 
@@ -33,6 +35,73 @@ class TestMarkdownComparator(TestCase):
         self.assertEqual('dummy_path2', diff.other.original)
         self.assertNotEqual([], diff.error_msgs)
 
+    @patch('validator.checks.md.markdown', side_effect=lambda text: text)
+    def test_render_shared_base_once(self, mock_markdown):
+        self.parser.parse.side_effect = lambda val: val
+        self.reader.read.side_effect = lambda path: path
+
+        errors = self.check.check([['# base', 'other1']], self.parser, self.reader)
+        errors += self.check.check([['# base', 'other2']], self.parser, self.reader)
+        for error in errors:
+            error.base.html, error.other.html
+
+        self.assertEqual(['# base', 'other1', 'other2'], [c[0][0] for c in mock_markdown.call_args_list])
+
+    @patch('validator.checks.md.markdown')
+    def test_clean_pairs_not_rendered(self, mock_markdown):
+        self.parser.parse.side_effect = lambda val: val
+        self.reader.read.side_effect = lambda path: path
+
+        with patch('sdiff.renderer.HtmlRenderer') as mock_renderer:
+            diffs = self.check.check([['# base', '# other', 'other']], self.parser, self.reader)
+
+            self.assertEqual(1, len(diffs))
+            mock_markdown.assert_not_called()
+            mock_renderer.assert_not_called()
+
+            diffs[0].other.diff
+            self.assertEqual(1, mock_renderer.call_count)
+
+    def test_lazy_content_pickled_rendered(self):
+        diffs = self._test_markdown('tests/fixtures/lang/en/test2.md', 'tests/fixtures/lang/de/test2.md')
+
+        diff = pickle.loads(pickle.dumps(diffs[0]))
+
+        self.assertEqual(diffs[0].base, diff.base)
+        self.assertEqual(diffs[0].other.diff, diff.other.diff)
+
+    def test_pickle_without_cache(self):
+        self.check._render_base('# base')
+
+        check = pickle.loads(pickle.dumps(self.check))
+
+        self.assertEqual(0, len(check._base_html))
+
+    def test_entries(self):
+        base = Entries([('title', '# Title'), ('body', 'Some text'), ('only_base', '# Base')])
+        other = Entries([('body', 'Some text'), ('title', 'Title'), ('only_other', 'Other')])
+        self.parser.parse.side_effect = lambda val: val
+        self.reader.read.side_effect = iter([base, other])
+
+        diffs = self.check.check([['dummy_path1', 'dummy_path2']], self.parser, self.reader)
+
+        self.assertEqual(1, len(diffs))
+        diff = diffs[0]
+        self.assertEqual('dummy_path2', diff.other.original)
+        self.assertEqual('# Title', diff.base.parsed)
+        self.assertEqual('Title', diff.other.parsed)
+        self.assertTrue(all(str(msg).startswith('title: ') for msg in diff.error_msgs))
+
+    def test_entries_diffed_once(self):
+        self.parser.parse.side_effect = lambda val: val
+        rows = [[Entries([('title', '# Title')]), Entries([('title', 'Title')])] for _ in range(3)]
+
+        with patch('validator.checks.md.diff', wraps=md.diff) as mock_diff:
+            diffs = self.check.check(rows, self.parser, TxtReader())
+
+        self.assertEqual(3, len(diffs))
+        self.assertEqual(1, mock_diff.call_count)
+
     @skip('not working')
     def test_markdown_broken_url(self):
         diffs = self._test_markdown('tests/fixtures/lang/en/test3.md', 'tests/fixtures/lang/de/test3.md')
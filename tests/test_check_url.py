@@ -1,7 +1,14 @@
+import asyncio
+import time
+import tempfile
+import shutil
+from pathlib import Path
+from unittest import TestCase
 from unittest.mock import patch, MagicMock
-from . import AsyncTestCase, AsyncContext
+from . import AsyncTestCase, AsyncContext, AsyncMock, response
 
 from validator.checks import url
+from validator.cache import UrlStatusCache
 
 
 class TestTxtExtractor(AsyncTestCase):
@@ -31,6 +38,120 @@ class TestTxtExtractor(AsyncTestCase):
         self.assertEqual([], actual)
 
 
+class TestCompiledTxtExtractor(TestTxtExtractor):
+    samples = [
+        '',
+        'no links here',
+        'see www.google.com, and http://example.com/a?b=c#d.',
+        '[link](https://example.com/path_(1)) and <http://example.com/x>',
+        'HTTP://EXAMPLE.COM/UPPER and WWW.Example.com',
+        'prefix-http://example.com/a http://http://example.com',
+        'http://www.{{param}}.com http://www.google.com',
+        '!keep http://example.com/kept !keephttp://example.com/other',
+        'İstanbul http://example.com/İ www.example.com',
+        'broken http:// and www. and http://a\x07b.com',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.extractor = url.CompiledTextUrlExtractor()
+
+    def test_same_urls_as_default_extractor(self):
+        default = url.TextUrlExtractor()
+        for sample in self.samples:
+            with self.subTest(sample=sample):
+                self.assertEqual(list(default.extract_urls(sample)), list(self.extractor.extract_urls(sample)))
+
+
+class TestUrlScheduler(AsyncTestCase):
+    def _run(self, scheduler, urls, probe):
+        async def collect():
+            return [u async for u in scheduler.run(urls, probe)]
+        return self.coro(collect())
+
+    def test_limit_concurrency(self):
+        active = []
+        max_active = []
+
+        async def probe(item):
+            active.append(item)
+            max_active.append(len(active))
+            await asyncio.sleep(0.01)
+            active.remove(item)
+
+        urls = [MagicMock(url='http://host%s.com' % i) for i in range(5)]
+        result = self._run(url.UrlScheduler(max_concurrency=2), urls, probe)
+
+        self.assertEqual(set(urls), set(result))
+        self.assertEqual(2, max(max_active))
+
+    def test_yield_in_completion_order(self):
+        async def probe(item):
+            await asyncio.sleep(item.delay)
+
+        slow = MagicMock(url='http://slow.com', delay=0.05)
+        fast = MagicMock(url='http://fast.com', delay=0)
+        result = self._run(url.UrlScheduler(), [slow, fast], probe)
+
+        self.assertEqual([fast, slow], result)
+
+    def test_probe_error(self):
+        async def probe(item):
+            if item.url == 'http://broken.com':
+                raise RuntimeError('broken')
+            item.failure = None
+
+        urls = [MagicMock(url='http://broken.com'), MagicMock(url='http://ok.com'), MagicMock(url='http://ok2.com')]
+        result = self._run(url.UrlScheduler(max_concurrency=1), urls, probe)
+
+        self.assertEqual(urls, result)
+        self.assertEqual(['error', None, None], [item.failure for item in result])
+
+    def test_invalid_concurrency(self):
+        with self.assertRaises(ValueError):
+            url.UrlScheduler(max_concurrency=0)
+
+    def test_rate_limit_per_host(self):
+        async def probe(item):
+            pass
+
+        urls = [MagicMock(url='http://host.com/%s' % i) for i in range(3)]
+        start = time.monotonic()
+        self._run(url.UrlScheduler(host_rate_limit=20, host_burst=1), urls, probe)
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+class TestRetryPolicy(TestCase):
+    def test_exponential_backoff(self):
+        policy = url.RetryPolicy(backoff=1, max_backoff=3, jitter=0)
+        response = url.UrlResponse(500)
+
+        self.assertEqual([1, 2, 3], [policy.delay(response, attempt) for attempt in range(1, 4)])
+
+    def test_jitter(self):
+        policy = url.RetryPolicy(backoff=1, jitter=0.5)
+
+        delay = policy.delay(url.UrlResponse(500), 1)
+
+        self.assertTrue(1 <= delay <= 1.5)
+
+    def test_retry_after(self):
+        policy = url.RetryPolicy(max_retry_after=10)
+
+        self.assertEqual(5, policy.delay(url.UrlResponse(429, retry_after=5), 1))
+        self.assertEqual(10, policy.delay(url.UrlResponse(429, retry_after=100), 1))
+
+    def test_retry_rules(self):
+        policy = url.RetryPolicy(max_count=2)
+
+        self.assertTrue(policy.should_retry(url.UrlResponse(503), 1))
+        self.assertTrue(policy.should_retry(url.UrlResponse(None, 'timeout'), 1))
+        self.assertFalse(policy.should_retry(url.UrlResponse(503), 2))
+        self.assertFalse(policy.should_retry(url.UrlResponse(404), 1))
+        self.assertFalse(policy.should_retry(url.UrlResponse(None, 'dns'), 1))
+
+
 class TestTxt(AsyncTestCase):
     def setUp(self):
         super().setUp()
@@ -41,19 +162,17 @@ class TestTxt(AsyncTestCase):
 
     def _check(self, mock_get, content, status_code):
         self.parser.parse.return_value = content
-        res = MagicMock()
-        res.status = status_code
-        mock_get.return_value = AsyncContext(context=res)
+        mock_get.return_value = AsyncContext(context=response(status_code))
 
         return self.check.check([['dummy_path']], self.parser, self.reader)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_happy_path(self, mock_get):
         invalid_urls = self._check(mock_get, 'aaa http://www.google.com aaa', 200)
 
         self.assertEqual([], invalid_urls)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_not_found(self, mock_get):
         invalid_urls = self._check(mock_get, 'aaa http://www.google.com aaa', 404)
 
@@ -63,79 +182,199 @@ class TestTxt(AsyncTestCase):
         self.assertEqual(['dummy_path'], url.files)
         self.assertEqual(404, url.status_code)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
+    def test_fast_extractor(self, mock_get):
+        self.check = url.UrlValidator('txt', headers=self.headers, extractor='fast')
+
+        invalid_urls = self._check(mock_get, 'aaa http://www.google.com aaa', 404)
+
+        self.assertEqual(['http://www.google.com'], [error.url for error in invalid_urls])
+
+    def test_unknown_extractor(self):
+        with self.assertRaises(url.MissingUrlExtractorError):
+            url.UrlValidator('txt', extractor='missing')
+
+    @patch('aiohttp.ClientSession.request')
     def test_retry_for_server_error(self, mock_get):
         self._check(mock_get, 'aaa http://www.google.com aaa', 500)
 
         self.assertEqual(3, mock_get.call_count)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
+    def test_retry_after_too_many_requests(self, mock_get):
+        throttled = response(429, headers={'Retry-After': '0'})
+        mock_get.side_effect = [AsyncContext(context=throttled), AsyncContext(context=response(200))]
+        self.parser.parse.return_value = 'aaa http://www.google.com aaa'
+
+        invalid_urls = self.check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual([], invalid_urls)
+        self.assertEqual(2, mock_get.call_count)
+
+    @patch('aiohttp.ClientSession.request')
+    def test_report_timeout(self, mock_get):
+        self.check = url.UrlValidator('txt', retry_policy=url.RetryPolicy(max_count=1))
+        mock_get.side_effect = asyncio.TimeoutError()
+        self.parser.parse.return_value = 'aaa http://www.google.com aaa'
+
+        invalid_urls = self.check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual(1, len(invalid_urls))
+        self.assertEqual('timeout', invalid_urls[0].failure)
+        self.assertIsNone(invalid_urls[0].status_code)
+
+    @patch('aiohttp.ClientSession.request')
+    def test_stream_invalid_urls(self, mock_get):
+        self.parser.parse.return_value = 'aaa http://www.google.com aaa'
+        mock_get.return_value = AsyncContext(context=response(404))
+
+        invalid_urls = self.check.iter_check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual(['http://www.google.com'], [u.url for u in invalid_urls])
+
+    @patch('aiohttp.ClientSession.request')
     def test_make_only_one_request_per_unique_url(self, mock_get):
         self._check(mock_get, 'aaa http://www.google.com aaa http://www.google.com aaa', 200)
 
         self.assertEqual(1, mock_get.call_count)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_parameterized_urls_in_middle(self, mock_get):
         self._check(mock_get, 'aaa http://domain.com/{{param}} aaa', 200)
 
         self.assertFalse(mock_get.called)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_parameterized_urls_from_start(self, mock_get):
         self._check(mock_get, 'aaa http://{{ticket.url}}, aaa', 200)
 
         self.assertFalse(mock_get.called)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_urls_with_variables(self, mock_get):
         self._check(mock_get, 'aaa http://domain.com/{ticket.url}, aaa', 200)
 
         self.assertFalse(mock_get.called)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_include_params_in_the_url(self, mock_get):
         self._check(mock_get, 'aaa http://domain.com/hello?id=123 aaa', 200)
 
         mock_get.assert_called_with('get', 'http://domain.com/hello?id=123', allow_redirects=True, headers=self.headers)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_empty_urls(self, mock_get):
         self._check(mock_get, 'aaa http:// aaa', 200)
 
         self.assertFalse(mock_get.called)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_email(self, mock_get):
         self._check(mock_get, 'aaa support@getkeepsafe.com aaa', 200)
 
         self.assertFalse(mock_get.called)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_commas(self, mock_get):
         self._check(mock_get, 'aaa http://{{ticket.url}}, aaa', 404)
 
         self.assertFalse(mock_get.called)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_commas_url(self, mock_get):
         self._check(mock_get, 'aaa http://www.google.com, aaa', 200)
 
         mock_get.assert_called_with('get', 'http://www.google.com', allow_redirects=True, headers=self.headers)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_chineese_commas(self, mock_get):
         self._check(mock_get, 'aaa http://bit.ly/UpdateKeepSafe。拥有最新版本就能解决大部分问题了。 aaa', 200)
 
         mock_get.assert_called_with('get', 'http://bit.ly/UpdateKeepSafe', allow_redirects=True, headers=self.headers)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_keepsafe_urls(self, mock_get):
         self._check(mock_get, 'aaa keepsafe://access.getkeepsafe.com/upgrade/email-premium-hint aaa', 200)
 
         self.assertFalse(mock_get.called)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.TCPConnector')
+    @patch('aiohttp.ClientSession')
+    def test_share_session_between_requests(self, mock_session, mock_connector):
+        self.check = url.UrlValidator('txt', connection_limit=5, connection_limit_per_host=2, dns_cache_ttl=60)
+        session = MagicMock()
+        session.request.return_value = AsyncContext(context=response(200))
+        mock_session.return_value = AsyncContext(context=session)
+        self.parser.parse.return_value = 'aaa http://www.google.com http://www.google.com/about aaa'
+
+        self.check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual(1, mock_session.call_count)
+        self.assertEqual(2, session.request.call_count)
+        mock_connector.assert_called_with(limit=5, limit_per_host=2, ttl_dns_cache=60)
+
+    @patch('aiohttp.ClientSession.request')
+    def test_skip_request_for_cached_status(self, mock_get):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = UrlStatusCache(Path(directory, 'urls.sqlite'))
+        cache.set('http://www.google.com', 404)
+        self.check = url.UrlValidator('txt', headers=self.headers, status_cache=cache)
+
+        invalid_urls = self._check(mock_get, 'aaa http://www.google.com http://www.google.com/about aaa', 200)
+
+        mock_get.assert_called_once_with('get', 'http://www.google.com/about', allow_redirects=True,
+                                         headers=self.headers)
+        self.assertEqual(['http://www.google.com'], [u.url for u in invalid_urls])
+        self.assertEqual(200, cache.get('http://www.google.com/about'))
+
+    @patch('aiohttp.ClientSession.request')
+    def test_head_first(self, mock_get):
+        self.check = url.UrlValidator('txt', headers=self.headers, head_first=True)
+        self._check(mock_get, 'aaa http://www.google.com aaa', 200)
+
+        mock_get.assert_called_once_with('head', 'http://www.google.com', allow_redirects=True, headers=self.headers)
+
+    @patch('aiohttp.ClientSession.request')
+    def test_head_first_fallback_to_get(self, mock_get):
+        self.check = url.UrlValidator('txt', headers=self.headers, head_first=True)
+        head_res = response(405)
+        get_res = response(200)
+        mock_get.side_effect = [AsyncContext(context=head_res), AsyncContext(context=get_res)]
+        self.parser.parse.return_value = 'aaa http://www.google.com aaa'
+
+        invalid_urls = self.check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual([], invalid_urls)
+        mock_get.assert_called_with('get', 'http://www.google.com', allow_redirects=True, headers=self.headers)
+        self.assertTrue(get_res.close.called)
+
+    @patch('aiohttp.ClientSession.request')
+    def test_read_small_body(self, mock_get):
+        res = response(200, content_length=100, read=AsyncMock())
+        mock_get.return_value = AsyncContext(context=res)
+        self.parser.parse.return_value = 'aaa http://www.google.com aaa'
+
+        self.check.check([['dummy_path']], self.parser, self.reader)
+
+        # the body is read so the connection can be reused
+        self.assertTrue(res.read.called)
+        self.assertFalse(res.close.called)
+
+    @patch('aiohttp.ClientSession.request')
+    def test_drop_large_body(self, mock_get):
+        for content_length in [None, url.UrlStatusChecker.drain_max_size + 1]:
+            with self.subTest(content_length=content_length):
+                res = response(200, content_length=content_length, read=AsyncMock())
+                mock_get.return_value = AsyncContext(context=res)
+                self.parser.parse.return_value = 'aaa http://www.google.com aaa'
+
+                self.check.check([['dummy_path']], self.parser, self.reader)
+
+                self.assertFalse(res.read.called)
+                self.assertTrue(res.close.called)
+
+    @patch('aiohttp.ClientSession.request')
     def test_check_headers(self, mock_get):
         self.check = url.UrlValidator('txt', allow_redirects=True, headers=self.headers)
         self._check(mock_get, 'aaa http://www.google.com, aaa', 200)
@@ -144,73 +383,73 @@ class TestTxt(AsyncTestCase):
 
 
 class TestHtml(AsyncTestCase):
+    extractor = 'default'
+
     def setUp(self):
         super().setUp()
         self.headers = {'User-Agent': 'test'}
-        self.check = url.UrlValidator('html', headers=self.headers)
+        self.check = url.UrlValidator('html', headers=self.headers, extractor=self.extractor)
         self.parser = MagicMock()
         self.reader = MagicMock()
 
     def _check(self, mock_get, content, status_code, check=None):
         check = check or self.check
         self.parser.parse.return_value = content
-        res = MagicMock()
-        res.status = status_code
-        mock_get.return_value = AsyncContext(context=res)
+        mock_get.return_value = AsyncContext(context=response(status_code))
 
         return check.check(['dummy_path'], self.parser, self.reader)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_happy_path(self, mock_get):
         errors = self._check(mock_get, '<a href="http://www.google.com">link</a>', 200)
 
         mock_get.assert_called_with('get', 'http://www.google.com', allow_redirects=True, headers=self.headers)
         self.assertEqual([], errors)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_url_in_text_no_href(self, mock_get):
         errors = self._check(mock_get, '<a>http://www.google.com</a>', 200)
 
         self.assertEqual([], errors)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_url_with_unaccepted_chars(self, mock_get):
         errors = self._check(mock_get, '<a>http://www.google.com/\u200e?asd</a>', 200)
 
         self.assertEqual(1, len(errors))
         self.assertEqual(True, errors[0].has_disallowed_chars)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_add_http_if_missing(self, mock_get):
         errors = self._check(mock_get, '<a href="www.google.com">link</a>', 200)
 
         self.assertEqual([], errors)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_image(self, mock_get):
         self._check(mock_get, '<img src="http://www.google.com">', 200)
 
         self.assertTrue(mock_get.called)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_request_parameterized_urls(self, mock_get):
         self._check(mock_get, '<a href="{{url}}">link</a>', 200)
 
         self.assertFalse(mock_get.called)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_empty_urls(self, mock_get):
         self._check(mock_get, '<a href=""></a>', 200)
 
         self.assertFalse(mock_get.called)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_email(self, mock_get):
         self._check(mock_get, '<a href="support@getkeepsafe.com"></a>', 200)
 
         self.assertFalse(mock_get.called)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_keepsafe_urls(self, mock_get):
         errors = self._check(mock_get,
                              '<a href="keepsafe://access.getkeepsafe.com/upgrade/email-premium-hint"></a>',
@@ -219,9 +458,54 @@ class TestHtml(AsyncTestCase):
         self.assertFalse(mock_get.called)
         self.assertEqual([], errors)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_skip_images(self, mock_get):
-        check = url.UrlValidator('html', skip_images=True)
+        check = url.UrlValidator('html', skip_images=True, extractor=self.extractor)
         self._check(mock_get, '<img alt="image" src="http://no-image" />', 200, check)
 
         self.assertFalse(mock_get.called)
+
+
+class TestStreamingHtml(TestHtml):
+    extractor = 'fast'
+
+
+class TestHtmlExtractorParity(TestCase):
+    samples = [
+        '',
+        'no links here',
+        '<a href="http://www.google.com">link</a><a href="http://www.google.com">again</a>',
+        '<a>www.google.com</a> <a href="">http://example.com/text</a>',
+        '<a>before <b>http://example.com</b> after</a>',
+        '<a href="http://outer.com"><a>http://inner.com</a></a>',
+        '<a><script>http://script.com</script>http://example.com</a>',
+        '<a><!-- http://comment.com -->http://example.com</a>',
+        '<a>&lt;http://example.com&gt;</a>',
+        '<p><a href="/relative">rel</a><a href="mailto:support@getkeepsafe.com">mail</a></p>',
+        '<img src="http://example.com/a.png"><img><img src=""><img alt="x" src="/b.png">',
+        '<a href="http://example.com/{{param}}">param</a><a href="http://{param}.com">param</a>',
+        '<a href=http://example.com/a?b=c&d=e>unquoted</a><a href="www.example.com',
+        '<table><tr><td><a href="http://table.com">cell</a></td></tr></table>',
+    ]
+
+    def assertSameUrls(self, **kwargs):
+        default = url.HtmlUrlExtractor(**kwargs)
+        streaming = url.StreamingHtmlUrlExtractor(**kwargs)
+        for sample in self.samples:
+            with self.subTest(sample=sample):
+                self.assertEqual(sorted(default.extract_urls(sample)), sorted(streaming.extract_urls(sample)))
+
+    def test_same_urls(self):
+        self.assertSameUrls()
+
+    def test_same_urls_with_root_url(self):
+        self.assertSameUrls(root_url='http://root.com')
+
+    def test_same_urls_without_images(self):
+        self.assertSameUrls(skip_images=True)
+
+    def test_keep_placeholders(self):
+        content = '<a href="http://example.com/{{param}}">param</a>'
+        default = url.HtmlUrlExtractor().extract_urls(content, keep_placeholders=True)
+
+        self.assertEqual(default, url.StreamingHtmlUrlExtractor().extract_urls(content, keep_placeholders=True))
@@ -27,3 +27,15 @@ class TestUrlOccurenciesValidator(TestCase):
                                          'tests/fixtures/lang/de/url_occurences_diff.txt')
 
         self.assertEqual(1, len(diffs))
+
+    def test_extract_shared_base_once(self):
+        self.parser.parse.side_effect = lambda val: val
+        self.reader.read.side_effect = lambda x: read(x)
+        self.check.extractor = MagicMock(wraps=self.check.extractor)
+        base = 'tests/fixtures/lang/en/url_occurences_test.txt'
+        other = 'tests/fixtures/lang/de/url_occurences_test.txt'
+
+        self.check.check([[base, other]], self.parser, self.reader)
+        self.check.check([[base, other]], self.parser, self.reader)
+
+        self.assertEqual(3, self.check.extractor.extract_urls.call_count)
@@ -0,0 +1,28 @@
+from unittest import TestCase
+from collections import OrderedDict
+
+from validator.errors import ContentData
+
+
+class TestContentData(TestCase):
+    def test_tuple_api(self):
+        data = ContentData('a.md', 'text', lambda: '<p>diff</p>', '<p>text</p>')
+
+        self.assertEqual(4, len(data))
+        self.assertEqual('<p>diff</p>', data[2])
+        self.assertEqual(('a.md', 'text'), data[:2])
+        self.assertEqual(('a.md', 'text', '<p>diff</p>', '<p>text</p>'), data)
+        self.assertEqual(data, ContentData._make(['a.md', 'text', '<p>diff</p>', '<p>text</p>']))
+        self.assertEqual(OrderedDict([('original', 'a.md'), ('parsed', 'text'), ('diff', '<p>diff</p>'),
+                                      ('html', '<p>text</p>')]), data._asdict())
+
+    def test_replace_keeps_pending_content(self):
+        rendered = []
+        data = ContentData('a.md', 'text', lambda: rendered.append('diff') or '<p>diff</p>')
+
+        other = data._replace(original='b.md')
+
+        self.assertEqual([], rendered)
+        self.assertEqual(('b.md', 'text', '<p>diff</p>', ''), tuple(other))
+        with self.assertRaises(ValueError):
+            data._replace(missing='x')
@@ -1,5 +1,8 @@
-from unittest import TestCase
+from unittest import TestCase, skipIf
 from pathlib import Path
+import tempfile
+import shutil
+import os
 
 from validator.fs import files
 
@@ -65,3 +68,106 @@ class TestPaths(TestCase):
     def test_fail_on_missing_parameter(self):
         with self.assertRaises(ValueError):
             files('tests/fixtures/flat/test.{lang}.txt')
+
+
+class TestParamsPattern(TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(self.directory))
+
+    def _touch(self, *names):
+        for name in names:
+            path = self.directory.joinpath(name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.touch()
+
+    def _files(self, pattern, **kwargs):
+        return list(files(str(self.directory) + '/' + pattern, **kwargs))
+
+    def test_sorted(self):
+        self._touch('en/b.md', 'fr/b.md', 'de/a.md', 'en/a.md', 'fr/a.md')
+
+        actual = self._files('{lang}/*.md', lang='en')
+
+        self.assertEqual([[self.directory.joinpath(lang, name) for lang in ['en', 'de', 'fr']]
+                          for name in ['a.md', 'b.md']], actual)
+
+    def test_pair_missing_translations(self):
+        self._touch('en/a.md', 'en/b.md', 'de/a.md')
+
+        actual = self._files('{lang}/*.md', lang='en')
+
+        self.assertEqual([self.directory.joinpath('en/b.md'), self.directory.joinpath('de/b.md')], actual[1])
+
+    @skipIf(os.path.normcase('A') == 'a', 'paths are case insensitive')
+    def test_case_sensitive(self):
+        self._touch('en/a.md', 'de/a.md', 'en/b.MD', 'de/b.MD', 'EN/a.md')
+
+        actual = self._files('{lang}/*.md', lang='en')
+
+        self.assertEqual([[self.directory.joinpath('en/a.md'), self.directory.joinpath('EN/a.md'),
+                           self.directory.joinpath('de/a.md')]], actual)
+
+    def test_repeated_parameter(self):
+        self._touch('en/a.en.md', 'de/a.de.md', 'fr/a.de.md')
+
+        actual = self._files('{lang}/a.{lang}.md', lang='en')
+
+        self.assertEqual([[self.directory.joinpath('en/a.en.md'), self.directory.joinpath('de/a.de.md')]], actual)
+
+    def test_wildcard_within_directory(self):
+        self._touch('en/a.md', 'de/a.md', 'en/nested/b.md', 'de/nested/b.md')
+
+        actual = self._files('{lang}/*.md', lang='en')
+
+        self.assertEqual(1, len(actual))
+
+    def test_recursive_wildcard(self):
+        self._touch('a/en/x.md', 'a/de/x.md', 'a/b/en/x.md', 'a/b/de/x.md')
+
+        actual = self._files('**/{lang}/x.md', lang='en')
+
+        self.assertEqual([self.directory.joinpath('a/en/x.md'), self.directory.joinpath('a/b/en/x.md')],
+                         [row[0] for row in actual])
+
+    def test_same_files_as_glob(self):
+        self._touch('tree/en/file1.md', 'tree/en/file2.md', 'tree/en/file10.md', 'tree/en/f^.md',
+                    'tree/de/file2.md', 'tree/de/f^.md', 'tree/a/en/x.md', 'tree/a/b/en/y.md', 'tree/a/de/x.md')
+        for pattern in ['tree/{lang}/file?.md', 'tree/{lang}/file[0-9].md', 'tree/{lang}/file[!1].md',
+                        'tree/{lang}/f[^]*.md', 'tree/**/{lang}/*.md', '**/{lang}/x.md']:
+            with self.subTest(pattern=pattern):
+                expected = sorted(self.directory.glob(pattern.format(lang='en')))
+                self.assertNotEqual([], expected)
+
+                actual = self._files(pattern, lang='en')
+
+                self.assertEqual(expected, sorted(row[0] for row in actual))
+
+    def test_escaped_braces(self):
+        self._touch('{x}/en.md', '{x}/de.md')
+
+        actual = self._files('{{x}}/{lang}.md', lang='en')
+
+        self.assertEqual([[self.directory.joinpath('{x}/en.md'), self.directory.joinpath('{x}/de.md')]], actual)
+
+    def test_drop_missing(self):
+        self._touch('en/a.md', 'de/a.md', 'en/b.md', 'fr/b.md', 'de/c.md', 'fr/c.md')
+
+        actual = self._files('{lang}/*.md', missing='drop', lang='en')
+
+        self.assertEqual([[self.directory.joinpath('en/a.md'), self.directory.joinpath('de/a.md')],
+                          [self.directory.joinpath('en/b.md'), self.directory.joinpath('fr/b.md')]], actual)
+
+    def test_report_missing(self):
+        self._touch('en/a.md', 'de/a.md', 'en/b.md', 'fr/b.md')
+        reported = []
+
+        actual = self._files('{lang}/*.md', missing=lambda base, paths: reported.append((base, paths)), lang='en')
+
+        self.assertEqual(2, len(actual))
+        self.assertEqual([(self.directory.joinpath('en/a.md'), [self.directory.joinpath('fr/a.md')]),
+                          (self.directory.joinpath('en/b.md'), [self.directory.joinpath('de/b.md')])], reported)
+
+    def test_fail_on_unknown_missing_option(self):
+        with self.assertRaises(ValueError):
+            files('tests/fixtures/flat/test.{lang}.txt', missing='ignore', lang='en')
@@ -0,0 +1,97 @@
+from unittest import TestCase
+from pathlib import Path
+import tempfile
+import shutil
+
+from validator.checks import ChainCheck
+from validator.manifest import Manifest
+from validator.parsers import ChainParser, FileReader
+
+
+class RecordingCheck(object):
+    rowwise = True
+
+    def __init__(self, name='check'):
+        self.name = name
+        self.rows = []
+
+    def check(self, data, parser, reader):
+        errors = []
+        for base, *others in data:
+            for other in others:
+                self.rows.append(other.name)
+                errors.append('%s %s' % (parser.parse(reader.read(base)), parser.parse(reader.read(other))))
+        return errors
+
+
+class CountingReader(FileReader):
+    def __init__(self):
+        self.paths = []
+
+    def read(self, path):
+        self.paths.append(path.name)
+        return super().read(path)
+
+
+class TestIncremental(TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(self.directory))
+        self.base = self._write('base.txt', 'base')
+        self.first = self._write('first.txt', 'first')
+        self.second = self._write('second.txt', 'second')
+
+    def _write(self, name, content):
+        path = self.directory.joinpath(name)
+        path.write_text(content)
+        return path
+
+    def _run(self, check, reader=None):
+        manifest = Manifest(self.directory.joinpath('manifest'))
+        chain = ChainCheck([check], manifest=manifest)
+        return chain.check([[self.base, self.first, self.second]], ChainParser([]), reader or FileReader())
+
+    def test_first_run_checks_everything(self):
+        check = RecordingCheck()
+
+        errors = self._run(check)
+
+        self.assertEqual(['base first', 'base second'], errors)
+        self.assertEqual(['first.txt', 'second.txt'], check.rows)
+
+    def test_reuse_unchanged_pairs(self):
+        self._run(RecordingCheck())
+        check = RecordingCheck()
+
+        errors = self._run(check)
+
+        self.assertEqual(['base first', 'base second'], errors)
+        self.assertEqual([], check.rows)
+
+    def test_recheck_changed_pairs(self):
+        self._run(RecordingCheck())
+        self.second.write_text('changed')
+        check = RecordingCheck()
+
+        errors = self._run(check)
+
+        self.assertEqual(['base first', 'base changed'], errors)
+        self.assertEqual(['second.txt'], check.rows)
+
+    def test_recheck_after_config_change(self):
+        self._run(RecordingCheck())
+        check = RecordingCheck('other')
+
+        self._run(check)
+
+        self.assertEqual(['first.txt', 'second.txt'], check.rows)
+
+    def test_read_files_once(self):
+        reader = CountingReader()
+        self._run(RecordingCheck(), reader)
+        self.assertEqual(['base.txt', 'first.txt', 'second.txt'], sorted(reader.paths))
+
+        self.second.write_text('changed')
+        reader = CountingReader()
+        self._run(RecordingCheck(), reader)
+        self.assertEqual(['base.txt', 'first.txt', 'second.txt'], sorted(reader.paths))
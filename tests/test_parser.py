@@ -1,12 +1,196 @@
 from unittest import TestCase
+from unittest.mock import patch
+from pathlib import Path
+import tempfile
+import shutil
+import pickle
 
+import validator
 from validator import parsers
 
 from tests.utils import read
 
 
 class TestPaths(TestCase):
+    def test_chain_parses_entries(self):
+        parser = parsers.ChainParser([parsers.XmlParser(key='name'), parsers.MarkdownParser()])
+        entries = parser.parse('<resources><string name="a">**a**</string><string name="b">b</string></resources>')
+        self.assertEqual(parsers.Entries([('a', '<p><strong>a</strong></p>'), ('b', '<p>b</p>')]), entries)
+
     def test_xml_parsing(self):
         content = read('tests/fixtures/bugs/parser_bug.xml')
         parser = parsers.XmlParser()
         parser.parse(content)
+
+    def test_lxml_xml_parsing(self):
+        content = read('tests/fixtures/bugs/parser_bug.xml')
+        parser = parsers.LxmlXmlParser()
+        self.assertEqual(parsers.XmlParser().parse(content), parser.parse(content))
+
+
+class TestLxmlXmlParser(TestCase):
+    content = '''<?xml version="1.0" encoding="iso-8859-1"?>
+<!DOCTYPE resources [<!ENTITY app "Validator">]>
+<resources>
+    <!-- comment -->
+    <string name="title"> &app; &amp; friends </string>
+    <string name="empty"/>
+    <string name="markup">Some <b>bold</b> text</string>
+    <plurals name="files">
+        <item quantity="one">one file</item>
+        <string>nested</string>
+        <string>outer <string>inner</string></string>
+    </plurals>
+    <string name="cdata"><![CDATA[<i>Hé</i>]]></string>
+</resources>'''
+    queries = ['*', 'string', './/string', './/*', 'plurals/item', 'string[@name="markup"]']
+
+    def test_same_texts_as_etree(self):
+        for query in self.queries:
+            expected = parsers.XmlParser(query).parse(self.content)
+            for streaming in [True, False]:
+                with self.subTest(query=query, streaming=streaming):
+                    actual = parsers.LxmlXmlParser(query, streaming=streaming).parse(self.content)
+                    self.assertEqual(expected, actual)
+
+    def test_streamed_queries(self):
+        streamed = [query for query in self.queries if parsers.LxmlXmlParser(query)._tag is not None]
+        self.assertEqual(['*', 'string', './/string', './/*'], streamed)
+
+    def test_internal_entities(self):
+        content = '<!DOCTYPE r [<!ENTITY app "Validator">]><r><s>&app; app</s></r>'
+        # lxml before 5 has no 'internal' option
+        for resolve_entities in [parsers.LxmlXmlParser._resolve_entities, True]:
+            for streaming in [True, False]:
+                with self.subTest(resolve_entities=resolve_entities, streaming=streaming), \
+                        patch.object(parsers.LxmlXmlParser, '_resolve_entities', resolve_entities):
+                    actual = parsers.LxmlXmlParser(streaming=streaming).parse(content)
+                    self.assertEqual('Validator app', actual)
+                    self.assertEqual(parsers.XmlParser().parse(content), actual)
+
+    def test_external_entities_not_loaded(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(directory))
+        secret = directory.joinpath('secret.txt')
+        secret.write_text('secret')
+        contents = ['<!DOCTYPE r [<!ENTITY x SYSTEM "{}">]><r><s>&x;</s></r>'.format(secret.as_uri()),
+                    # declared through a parameter entity the declaration isn't visible in the document
+                    '<!DOCTYPE r [<!ENTITY % d "&#60;!ENTITY x SYSTEM \'{}\'>"> %d;]><r><s>&x;</s></r>'
+                    .format(secret.as_uri())]
+        for content in contents:
+            with self.assertRaises(parsers.ParserError):
+                parsers.ChainParser([parsers.XmlParser()]).parse(content)
+            for resolve_entities in [parsers.LxmlXmlParser._resolve_entities, True]:
+                for streaming in [True, False]:
+                    with self.subTest(content=content, resolve_entities=resolve_entities, streaming=streaming), \
+                            patch.object(parsers.LxmlXmlParser, '_resolve_entities', resolve_entities):
+                        parser = parsers.ChainParser([parsers.LxmlXmlParser(streaming=streaming)])
+                        with self.assertRaises(parsers.ParserError):
+                            parser.parse(content)
+
+    def test_empty_content(self):
+        self.assertEqual('', parsers.LxmlXmlParser().parse('  \n'))
+
+    def test_invalid_content(self):
+        parser = parsers.ChainParser([parsers.LxmlXmlParser()])
+        with self.assertRaises(parsers.ParserError):
+            parser.parse('<resources><string>')
+
+    def test_pickle(self):
+        parser = pickle.loads(pickle.dumps(parsers.LxmlXmlParser('.//string')))
+        self.assertEqual(parsers.XmlParser('.//string').parse(self.content), parser.parse(self.content))
+
+    def test_entries(self):
+        for parser in [parsers.XmlParser('.//*', key='name'), parsers.LxmlXmlParser('.//*', key='name')]:
+            with self.subTest(parser=type(parser).__name__):
+                entries = parser.parse(self.content)
+                self.assertIsInstance(entries, parsers.Entries)
+                self.assertEqual('Validator & friends', entries['title'])
+                # the item has no name, it's keyed by its position
+                self.assertEqual('one file', entries['#4'])
+                self.assertEqual(parsers.XmlParser('.//*').parse(self.content), str(entries))
+
+    def test_duplicate_entries(self):
+        content = '<r><s name="x">a</s><s name="y">b</s><s name="x">c</s><s name="x">d</s></r>'
+        for parser in [parsers.XmlParser(key='name'), parsers.LxmlXmlParser(key='name')]:
+            with self.subTest(parser=type(parser).__name__):
+                entries = parser.parse(content)
+                self.assertEqual(parsers.Entries([('x', 'a'), ('y', 'b'), ('x#2', 'c'), ('x#3', 'd')]), entries)
+
+    def test_empty_entries(self):
+        self.assertEqual(parsers.Entries(), parsers.LxmlXmlParser(key='name').parse(''))
+
+    def test_builder(self):
+        builder = validator.parse().text('<r><s>a</s></r>', '<r><s>b</s></r>').xml(engine='lxml')
+        self.assertIsInstance(builder.parsers[0], parsers.LxmlXmlParser)
+        with self.assertRaises(ValueError):
+            validator.parse().text('<r/>', '<r/>').xml(engine='sax')
+
+
+class TestBulkFileReader(TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(self.directory))
+
+    def _write(self, name, content):
+        path = self.directory.joinpath(name)
+        path.write_bytes(content.encode('utf-8'))
+        return path
+
+    def test_same_content_as_file_reader(self):
+        path = self._write('a.md', 'über\r\nline\rend\n')
+
+        self.assertEqual(parsers.FileReader().read(path), parsers.BulkFileReader().read(path))
+
+    def test_memory_map_large_files(self):
+        path = self._write('a.md', 'ü' * 1000)
+
+        self.assertEqual('ü' * 1000, parsers.BulkFileReader(mmap_threshold=10).read(path))
+
+    def test_decoding_errors(self):
+        path = self.directory.joinpath('a.md')
+        path.write_bytes(b'a\xffb')
+
+        self.assertEqual('a�b', parsers.BulkFileReader(errors='replace').read(path))
+        with self.assertRaises(UnicodeDecodeError):
+            parsers.BulkFileReader().read(path)
+
+    def test_missing_file(self):
+        self.assertEqual('', parsers.BulkFileReader().read(self.directory.joinpath('missing.md')))
+
+    def test_prefetch(self):
+        rows = [[self._write('%d.en.md' % i, 'en %d' % i), self._write('%d.de.md' % i, 'de %d' % i)]
+                for i in range(10)]
+        reader = parsers.BulkFileReader(workers=2, buffer_size=4)
+
+        contents = []
+        for row in reader.prefetch(iter(rows)):
+            self.assertLessEqual(len(reader._pending), 6)
+            contents.append([reader.read(path) for path in row])
+
+        self.assertEqual([['en %d' % i, 'de %d' % i] for i in range(10)], contents)
+        self.assertEqual({}, reader._pending)
+
+    def test_drop_unread_files(self):
+        rows = [[self._write('%d.md' % i, str(i))] for i in range(10)]
+        reader = parsers.BulkFileReader(buffer_size=2)
+
+        self.assertEqual(rows, list(reader.prefetch(rows)))
+        self.assertEqual({}, reader._pending)
+
+    def test_pickle(self):
+        reader = pickle.loads(pickle.dumps(parsers.BulkFileReader(errors='ignore')))
+
+        self.assertEqual('ignore', reader.errors)
+
+
+class TestBulkFileReaderValidation(TestCase):
+    def test_same_errors_as_file_reader(self):
+        pattern = 'tests/fixtures/lang/{lang}/test2.md'
+        expected = validator.parse().files(pattern, lang='en').check().md().java().validate()
+
+        actual = validator.parse().files(pattern, reader=parsers.BulkFileReader(), lang='en').check().md().java() \
+            .validate()
+
+        self.assertEqual([str(error.other.original) for error in expected],
+                         [str(error.other.original) for error in actual])
@@ -0,0 +1,38 @@
+from unittest import TestCase
+from concurrent.futures import ThreadPoolExecutor
+
+import markdown
+
+from validator import render
+
+from tests.utils import read
+
+
+class TestMarkdown(TestCase):
+    texts = [
+        '',
+        '# title\n\nsome *text* and [link](http://example.com)',
+        'text with a [reference][1]\n\n[1]: http://example.com',
+        'text with an <b>html</b> block\n\n<div>block</div>',
+        read('tests/fixtures/lang/en/test2.md'),
+    ]
+
+    def test_same_as_markdown(self):
+        for text in self.texts:
+            self.assertEqual(markdown.markdown(text), render.markdown(text))
+
+    def test_long_text(self):
+        text = '\n\n'.join(['paragraph with *emphasis*'] * 1000)
+        self.assertGreater(len(text), render.MEMOIZE_MAX_LENGTH)
+        self.assertEqual(markdown.markdown(text), render.markdown(text))
+
+    def test_converter_reset(self):
+        render.markdown('[reference][1] defined\n\n[1]: http://example.com')
+        # the reference of the previous text isn't known anymore
+        self.assertEqual(markdown.markdown('[reference][1] missing'), render.markdown('[reference][1] missing'))
+
+    def test_threads(self):
+        texts = ['# title {}\n\n[link {}][1]\n\n[1]: http://example.com/{}'.format(i, i, i) for i in range(200)]
+        with ThreadPoolExecutor(8) as executor:
+            rendered = list(executor.map(render._convert, texts))
+        self.assertEqual([markdown.markdown(text) for text in texts], rendered)
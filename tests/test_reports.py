@@ -0,0 +1,87 @@
+from unittest import TestCase
+from pathlib import Path
+import xml.etree.ElementTree as ET
+import tempfile
+import shutil
+import json
+import io
+
+import validator
+from validator import reports
+from validator.errors import UrlDiff, UrlOccurencyDiff, MdDiff, ContentData
+
+
+def _errors():
+    base, other = ContentData(Path('en/test.md'), '# a'), ContentData(Path('de/test.md'), 'a')
+    return [
+        MdDiff(base, other, ['structure differs']),
+        MdDiff(base, other, 'java args do not match', kind='java'),
+        UrlDiff('http://example.com/<missing>', [Path('en/test.md')], status_code=404),
+        UrlOccurencyDiff('en/test.md', 'de/test.md', {'http://a': None}, {}),
+    ]
+
+
+class TestJsonLinesReporter(TestCase):
+    def test_report(self):
+        output = io.StringIO()
+        reporter = reports.JsonLinesReporter(output)
+        reporter.start()
+        reporter.report_error(_errors()[0])
+        # every error is written as soon as it's reported
+        self.assertEqual(1, len(output.getvalue().splitlines()))
+        for error in _errors()[1:]:
+            reporter.report_error(error)
+        reporter.finish()
+
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+
+        self.assertEqual(['markdown', 'java', 'url', 'url_occurences'], [line['kind'] for line in lines])
+        self.assertEqual(['en/test.md', 'de/test.md'], lines[0]['files'])
+        self.assertEqual(['java args do not match'], lines[1]['error_msgs'])
+        self.assertEqual(404, lines[2]['status_code'])
+        self.assertEqual(['http://a'], lines[3]['base_urls'])
+        self.assertFalse(output.closed)
+
+    def test_report_to_path(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = Path(directory).joinpath('errors.jsonl')
+
+        reports.JsonLinesReporter(path).report(_errors())
+
+        self.assertEqual(4, len(path.read_text().splitlines()))
+
+
+class TestJUnitReporter(TestCase):
+    def test_report(self):
+        output = io.StringIO()
+        control_characters = MdDiff(ContentData('a', 'a'), ContentData('b', 'b'), ['\x00\x1b'])
+
+        reports.JUnitReporter(output).report(_errors() + [control_characters])
+
+        suite = ET.fromstring(output.getvalue()).find('testsuite')
+        cases = suite.findall('testcase')
+        self.assertEqual(['validator.markdown', 'validator.java', 'validator.url', 'validator.url_occurences',
+                          'validator.markdown'], [case.get('classname') for case in cases])
+        self.assertEqual('http://example.com/<missing>', cases[2].get('name'))
+        self.assertEqual('structure differs', cases[0].find('failure').get('message'))
+
+
+class TestJavaErrors(TestCase):
+    def test_files_of_entries(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(directory))
+        for lang, text in [('en', '%s files'), ('de', 'Dateien')]:
+            directory.joinpath(lang).mkdir()
+            directory.joinpath(lang, 'strings.xml').write_text(
+                '<resources><string name="count">{}</string></resources>'.format(text))
+        jsonl, junit = io.StringIO(), io.StringIO()
+
+        validator.parse().files(str(directory.joinpath('{lang}', 'strings.xml')), lang='en') \
+            .xml('string', key='name').check().java().report().jsonl(jsonl).junit(junit).validate()
+
+        paths = [str(directory.joinpath(lang, 'strings.xml')) for lang in ['en', 'de']]
+        line = json.loads(jsonl.getvalue())
+        self.assertEqual(paths, line['files'])
+        self.assertEqual(['count: java args do not match'], line['error_msgs'])
+        self.assertEqual([paths[1]], [case.get('name') for case in ET.fromstring(junit.getvalue()).iter('testcase')])
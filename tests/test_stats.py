@@ -0,0 +1,90 @@
+from unittest import TestCase
+from unittest.mock import patch
+from pathlib import Path
+import tempfile
+import shutil
+import json
+from . import AsyncTestCase, AsyncContext, response
+
+import validator
+from validator.stats import Stats, timer, NO_TIMER
+
+
+class TestStats(TestCase):
+    def test_timer(self):
+        stats = Stats()
+        with stats.timer('read'):
+            pass
+        with stats.timer('read'):
+            pass
+
+        calls, seconds = stats.timers['read']
+        self.assertEqual(2, calls)
+        self.assertGreaterEqual(seconds, 0)
+
+    def test_keep_slowest(self):
+        stats = Stats(slowest=2)
+        for key, seconds in [('a', 1), ('b', 3), ('c', 2), ('d', 0.5)]:
+            stats.add_time('read', seconds, key)
+
+        slowest = stats.as_dict()['slowest']['read']
+
+        self.assertEqual(['b', 'c'], [item['key'] for item in slowest])
+
+    def test_iter(self):
+        stats = Stats()
+
+        items = list(stats.iter('check', ['a', 'b'], counter='errors'))
+
+        self.assertEqual(['a', 'b'], items)
+        self.assertEqual(1, stats.timers['check'][0])
+        self.assertEqual(2, stats.counters['errors'])
+
+    def test_disabled(self):
+        self.assertIs(NO_TIMER, timer(None, 'read'))
+
+    def test_dump(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = Path(directory, 'stats.json')
+        stats = Stats(path=path)
+        stats.increment('bytes_read', 10)
+
+        stats.finish()
+
+        self.assertEqual({'bytes_read': 10}, json.loads(path.read_text())['counters'])
+
+
+class TestInstrumentedValidation(AsyncTestCase):
+    def test_record_stages(self):
+        builder = validator.parse().files('tests/fixtures/lang/{lang}/test2.md', lang='en').check().md().java()
+
+        errors = builder.instrument().validate()
+        stats = builder.stats.as_dict()
+
+        for name in ['validate', 'read', 'parse', 'sdiff.diff', 'check.MarkdownComparator', 'check.JavaComparator']:
+            self.assertIn(name, stats['timers'])
+        self.assertEqual(len(errors), stats['counters']['errors.MarkdownComparator'])
+        self.assertEqual(2, stats['counters']['store.misses'])
+        self.assertGreater(stats['counters']['bytes_read'], 0)
+        self.assertIn('test2.md', stats['slowest']['read'][0]['key'])
+
+    @patch('aiohttp.ClientSession.request')
+    def test_record_url_probes(self, mock_get):
+        mock_get.return_value = AsyncContext(context=response(200))
+        stats = Stats()
+
+        validator.parse().files('tests/fixtures/flat/test.en.txt').check().url().instrument(stats).validate()
+
+        self.assertEqual(mock_get.call_count, stats.counters['url.probed'])
+        self.assertIn('url.probe', stats.as_dict()['slowest'])
+
+    def test_report(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        stats = Stats()
+
+        validator.parse().files('tests/fixtures/lang/{lang}/test2.md', lang='en').check().md().instrument(stats) \
+            .report().html(directory).validate()
+
+        self.assertEqual(1, stats.timers['report'][0])
@@ -1,40 +1,64 @@
 from unittest import TestCase
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from pathlib import Path
 import tempfile
 import os
 import shutil
-from . import AsyncTestCase, AsyncContext
+import io
+import json
+import xml.etree.ElementTree as ET
+from . import AsyncTestCase, AsyncContext, response
+
+from bs4 import BeautifulSoup
 
 import validator
+from validator import reports
+from validator.errors import MdDiff, UrlDiff, ContentData
 
 
 class TestUrls(AsyncTestCase):
     def _test_plain_text(self):
         return validator.parse().files('tests/fixtures/flat/test.en.txt').check().url().validate()
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_plain_text_success(self, mock_get):
-        res = MagicMock()
-        res.status = 200
-        mock_get.return_value = AsyncContext(context=res)
+        mock_get.return_value = AsyncContext(context=response(200))
         errors = self._test_plain_text()
         self.assertEqual([], errors)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_plain_text_failure(self, mock_get):
-        res = MagicMock()
-        res.status = 404
-        mock_get.return_value = self.make_fut(res)
+        mock_get.return_value = self.make_fut(response(404))
         errors = self._test_plain_text()
         self.assertTrue(Path('tests/fixtures/flat/test.en.txt') in errors[0].files)
 
-    @patch('aiohttp.request')
+    @patch('aiohttp.ClientSession.request')
     def test_md_with_params(self, mock_get):
         validator.parse().files('tests/fixtures/flat/url_with_params.md').md().check().url().validate()
         self.assertFalse(mock_get.called)
 
 
+class TestAsync(AsyncTestCase):
+    @patch('aiohttp.ClientSession.request')
+    def test_run_checks_concurrently(self, mock_get):
+        mock_get.return_value = AsyncContext(context=response(404))
+
+        errors = self.coro(validator.parse().files('tests/fixtures/lang/{lang}/test2.md', lang='en').check()
+                           .md().url().java().async_validate())
+
+        self.assertEqual(['MdDiff', 'UrlDiff'], [type(e).__name__ for e in errors])
+
+
+class TestFiles(TestCase):
+    def test_drop_missing(self):
+        builder = validator.parse().files('tests/fixtures/lang/{lang}/*', missing='drop', lang='en')
+
+        bases = [row[0] for row in builder.contents]
+
+        self.assertIn(Path('tests/fixtures/lang/en/test1.md'), bases)
+        self.assertNotIn(Path('tests/fixtures/lang/en/test2.html'), bases)
+
+
 class TestMarkdown(TestCase):
     def test_markdown_same_structure(self):
         errors = validator.parse().files('tests/fixtures/lang/{lang}/test1.md', lang='en').check().md().validate()
@@ -50,6 +74,51 @@ class TestMarkdown(TestCase):
         self.assertEqual([], errors)
 
 
+class TestStreaming(TestCase):
+    def test_report_before_yield(self):
+        builder = validator.parse().files('tests/fixtures/lang/{lang}/test2.md', lang='en').check().md().report() \
+            .store()
+
+        errors = builder.iter_validate()
+
+        self.assertEqual([], builder.reporters[0].log)
+        next(errors)
+        self.assertEqual(1, len(builder.reporters[0].log))
+        self.assertEqual([], list(errors))
+
+    def test_finish_reporter_when_stopped_early(self):
+        output = io.StringIO()
+        builder = validator.parse().files('tests/fixtures/lang/{lang}/*.md', lang='en').check().md().report() \
+            .junit(output)
+
+        errors = builder.iter_validate()
+        next(errors)
+        errors.close()
+
+        self.assertTrue(output.getvalue().endswith('</testsuites>\n'))
+
+    def test_same_errors_as_validate(self):
+        expected = validator.parse().files('tests/fixtures/lang/{lang}/*.md', lang='en').check().md().validate()
+
+        errors = list(validator.parse().files('tests/fixtures/lang/{lang}/*.md', lang='en').check().md()
+                      .iter_validate())
+
+        self.assertEqual([str(e.other.original) for e in expected], [str(e.other.original) for e in errors])
+
+
+class TestParallel(TestCase):
+    def test_same_errors_as_sequential(self):
+        query = 'tests/fixtures/lang/{lang}/*.md'
+        expected = validator.parse().files(query, lang='en').check().md().java().validate()
+
+        errors = validator.parse().files(query, lang='en').check().md().java().parallel(workers=2, chunk_size=1) \
+            .validate()
+
+        self.assertNotEqual([], errors)
+        self.assertEqual([(str(e.base.original), str(e.other.original), list(e.error_msgs)) for e in expected],
+                         [(str(e.base.original), str(e.other.original), list(e.error_msgs)) for e in errors])
+
+
 class TestReporter(TestCase):
     def setUp(self):
         self.output_dir = tempfile.mkdtemp()
@@ -69,6 +138,149 @@ class TestReporter(TestCase):
 
         self.assertNotEqual([], os.listdir(self.output_dir))
 
+    def _slots(self, path):
+        soup = BeautifulSoup(path.read_text(), 'html.parser')
+        slots = {}
+        for slot in reports.TemplateHtmlReporter.slots:
+            element = soup.find(id=slot)
+            tags = [tag.name for tag in element.find_all(True) if tag.name != 'body']
+            slots[slot] = (tags, ' '.join(element.get_text().split()))
+        return slots
+
+    def test_template_report_same_as_soup(self):
+        builder = validator.parse().files('tests/fixtures/lang/{lang}/test2.md', lang='en').check().md().java() \
+            .report()
+        soup_dir = Path(self.output_dir).joinpath('soup')
+        template_dir = Path(self.output_dir).joinpath('template')
+        builder.html(str(soup_dir)).html(str(template_dir), engine='template').validate()
+
+        reports_paths = sorted(path.relative_to(soup_dir) for path in soup_dir.glob('**/*.html'))
+        self.assertNotEqual([], reports_paths)
+        template_paths = sorted(path.relative_to(template_dir) for path in template_dir.glob('**/*.html'))
+        self.assertEqual(reports_paths, template_paths)
+        for path in reports_paths:
+            self.assertEqual(self._slots(soup_dir.joinpath(path)), self._slots(template_dir.joinpath(path)))
+
+    def test_template_report_escapes_messages(self):
+        reporter = reports.TemplateHtmlReporter(self.output_dir)
+        data = ContentData('other.md', 'text', '<p>text</p>', '<p>text</p>')
+        report = reporter.render(MdDiff(data, data, ['missing <h1> & <p>', 'second']))
+        self.assertIn('missing &lt;h1&gt; &amp; &lt;p&gt;<br />second', report)
+
+    def _reporter(self, engine, **kwargs):
+        return validator.parse().text('', '').check().md().report().html(self.output_dir, engine=engine, **kwargs) \
+            .reporters[-1]
+
+    def _shared_path_errors(self, second='second'):
+        other = ContentData('docs/other.md', 'other', '<p>other</p>', '<p>other</p>')
+        return [MdDiff(ContentData('docs/base1.md', 'base1', '<p>base1</p>'), other, ['first']),
+                MdDiff(ContentData('docs/base2.md', 'base2', '<p>base2</p>'), other, [second])]
+
+    def test_errors_of_same_file_in_one_report(self):
+        for engine in ['soup', 'template']:
+            with self.subTest(engine=engine):
+                self._reporter(engine).report(self._shared_path_errors())
+
+                report = Path(self.output_dir).joinpath('docs/other.html')
+                self.assertEqual([report], list(Path(self.output_dir).glob('**/*.html')))
+                slots = self._slots(report)
+                self.assertEqual('first second', slots['error_msgs'][1])
+                self.assertEqual('base1 base2', slots['left_diff'][1])
+                self.assertEqual('other', slots['right_content'][1])
+
+    def test_url_report(self):
+        error = UrlDiff('http://example.com/<a>', [Path('docs/a.md'), Path('docs/b.md'), Path('docs/a.md')], 404)
+        for engine in ['soup', 'template']:
+            with self.subTest(engine=engine):
+                self._reporter(engine).report([error])
+
+                for name in ['a.html', 'b.html']:
+                    slots = self._slots(Path(self.output_dir).joinpath('docs', name))
+                    self.assertEqual((['span'], 'http://example.com/<a> returned with code 404'), slots['urls'])
+
+    def _incremental_report(self, engine):
+        validator.parse().files('tests/fixtures/lang/{lang}/test2.md', lang='en').check().md().report() \
+            .html(self.output_dir, engine=engine, incremental=True).validate()
+        return Path(self.output_dir).joinpath('tests/fixtures/lang/de/test2.html')
+
+    def test_incremental_report_unchanged(self):
+        for engine in ['soup', 'template']:
+            with self.subTest(engine=engine):
+                report = self._incremental_report(engine)
+                os.utime(str(report), ns=(0, 0))
+
+                self._incremental_report(engine)
+
+                self.assertEqual(0, report.stat().st_mtime_ns)
+
+    def test_incremental_report_changed(self):
+        report = self._incremental_report('template')
+        report.write_text('outdated')
+
+        self._incremental_report('template')
+
+        self.assertNotEqual('outdated', report.read_text())
+
+    def test_incremental_report_of_shared_file(self):
+        url = UrlDiff('http://example.com', [Path('docs/other.md')], 404)
+        for engine in ['soup', 'template']:
+            with self.subTest(engine=engine):
+                self._reporter(engine, incremental=True).report(self._shared_path_errors() + [url])
+                report = Path(self.output_dir).joinpath('docs/other.html')
+                os.utime(str(report), ns=(0, 0))
+
+                self._reporter(engine, incremental=True).report(self._shared_path_errors() + [url])
+                self.assertEqual(0, report.stat().st_mtime_ns)
+
+                self._reporter(engine, incremental=True).report(self._shared_path_errors('changed') + [url])
+                self.assertNotEqual(0, report.stat().st_mtime_ns)
+                self.assertEqual('first changed', self._slots(report)['error_msgs'][1])
+                index = BeautifulSoup(Path(self.output_dir).joinpath('index.html').read_text(), 'html.parser')
+                self.assertEqual(['docs/other.html'], [a['href'] for a in index.find_all('a')])
+
+    def test_incremental_report_of_index_file(self):
+        data = ContentData('index.md', 'index', '<p>index</p>', '<p>index</p>')
+        for engine in ['soup', 'template']:
+            with self.subTest(engine=engine):
+                self._reporter(engine, incremental=True).report([MdDiff(data, data, ['index error'])])
+
+                report = Path(self.output_dir).joinpath('index.html')
+                self.assertEqual('index error', self._slots(report)['error_msgs'][1])
+                index = BeautifulSoup(Path(self.output_dir).joinpath('_index.html').read_text(), 'html.parser')
+                self.assertEqual(['index.html'], [a['href'] for a in index.find_all('a')])
+
+    def test_incremental_report_removes_stale(self):
+        stale = Path(self.output_dir).joinpath('fixed', 'test.html')
+        stale.parent.mkdir()
+        stale.write_text('fixed')
+        other = Path(self.output_dir).joinpath('notes.txt')
+        other.write_text('notes')
+
+        self._incremental_report('template')
+
+        self.assertFalse(stale.parent.exists())
+        self.assertTrue(other.exists())
+
+    def test_incremental_report_index(self):
+        self._incremental_report('soup')
+
+        index = BeautifulSoup(Path(self.output_dir).joinpath('index.html').read_text(), 'html.parser')
+        self.assertEqual(['tests/fixtures/lang/de/test2.html'], [a['href'] for a in index.find_all('a')])
+
+    def test_jsonl_and_junit_reports(self):
+        jsonl = Path(self.output_dir).joinpath('errors.jsonl')
+        junit = Path(self.output_dir).joinpath('errors.xml')
+
+        errors = validator.parse().files('tests/fixtures/lang/{lang}/test2.md', lang='en').check().md().report() \
+            .jsonl(jsonl).junit(junit).validate()
+
+        self.assertEqual([error.as_dict() for error in errors], [json.loads(line) for line in jsonl.open()])
+        self.assertEqual(len(errors), len(ET.parse(str(junit)).findall('.//testcase')))
+
+    def test_unknown_html_engine(self):
+        with self.assertRaises(ValueError):
+            validator.parse().text('a', 'b').check().md().report().html(self.output_dir, engine='mustache')
+
 
 class TestBugs(TestCase):
     def _run_and_assert(self, query, **kwargs):
@@ -1,52 +1,115 @@
 import sdiff
 
 from . import parsers, checks, reports, fs
+from .cache import ContentStore
+from .manifest import Manifest
+from .stats import Stats, timer
 
 
 class Validator(object):
-    def __init__(self, contents, parser, reader, check, reporter=None):
+    def __init__(self, contents, parser, reader, check, reporter=None, stats=None):
         self.contents = contents
         self.parser = parser
         self.reader = reader
         self.check = check
         self.reporter = reporter
+        self.stats = stats
 
-    def validate(self):
-        errors = self.check.check(self.contents, self.parser, self.reader)
+    def _report(self, errors):
         if self.reporter is not None:
-            self.reporter.report(errors)
+            with timer(self.stats, 'report'):
+                self.reporter.report(errors)
+
+    def _finish(self):
+        if self.stats is not None:
+            self.stats.finish()
+
+    def validate(self):
+        with timer(self.stats, 'validate'):
+            errors = self.check.check(self.contents, self.parser, self.reader)
+            self._report(errors)
+        self._finish()
         return errors
 
     async def async_validate(self):
-        errors = await self.check.async_check(self.contents, self.parser, self.reader)
-        if self.reporter is not None:
-            self.reporter.report(errors)
+        with timer(self.stats, 'validate'):
+            errors = await self.check.async_check(self.contents, self.parser, self.reader)
+            self._report(errors)
+        self._finish()
         return errors
 
+    def iter_validate(self):
+        """
+        Yields errors one at a time as the checks find them, every error is reported before it's yielded. The
+        reporter is finished even when the iteration stops early.
+        """
+        if self.reporter is not None:
+            self.reporter.start()
+        try:
+            for error in self.check.iter_check(self.contents, self.parser, self.reader):
+                if self.reporter is not None:
+                    with timer(self.stats, 'report'):
+                        self.reporter.report_error(error)
+                yield error
+        finally:
+            if self.reporter is not None:
+                self.reporter.finish()
+            self._finish()
+
 
 class ReportBuilder(object):
-    def __init__(self, contents, parser, reader, check):
+    _html_reporters = {'soup': reports.HtmlReporter, 'template': reports.TemplateHtmlReporter}
+
+    def __init__(self, contents, parser, reader, check, stats=None):
         self.contents = contents
         self.parser = parser
         self.reader = reader
         self.check = check
+        self.stats = stats
         self.reporters = []
 
-    def html(self, output_directory='errors'):
-        self.reporters.append(reports.HtmlReporter(output_directory))
+    def html(self, output_directory='errors', engine='soup', **kwargs):
+        """
+        ``engine='template'`` fills the report template by string substitution and writes the reports in threads,
+        see ``TemplateHtmlReporter``. With ``incremental=True`` only the reports which changed are written, see
+        ``HtmlReporter``.
+        """
+        if engine not in self._html_reporters:
+            raise ValueError('engine has to be soup or template, got {}'.format(engine))
+        self.reporters.append(self._html_reporters[engine](output_directory, **kwargs))
         return self
 
     def console(self):
         self.reporters.append(reports.ConsoleReporter())
         return self
 
+    def jsonl(self, output):
+        """
+        Writes every error as a line of json to ``output``, a path or an open file.
+        """
+        self.reporters.append(reports.JsonLinesReporter(output))
+        return self
+
+    def junit(self, output):
+        """
+        Writes every error as a failed JUnit test case to ``output``, a path or an open file.
+        """
+        self.reporters.append(reports.JUnitReporter(output))
+        return self
+
     def store(self):
         self.reporters.append(reports.StoreReporter())
         return self
 
-    def validate(self):
+    def _validator(self):
         reporter = reports.ChainReporter(self.reporters)
-        return Validator(self.contents, self.parser, self.reader, self.check, reporter).validate()
+        return Validator(self.contents, self.parser, self.reader, self.check, reporter, self.stats)
+
+    def validate(self):
+        return self._validator().validate()
+
+    def iter_validate(self):
+        return self._validator().iter_validate()
 
 
 class CheckBuilder(object):
@@ -56,6 +119,11 @@ class CheckBuilder(object):
         self.parser = parser
         self.reader = reader
         self.checks = []
+        self.cache_size = ContentStore.default_max_size
+        self.workers = None
+        self.chunk_size = None
+        self.manifest = None
+        self.stats = None
 
     def md(self):
         self.checks.append(checks.markdown(self.content_type,
@@ -75,21 +143,66 @@ class CheckBuilder(object):
         self.checks.append(checks.java_args(self.content_type))
         return self
 
+    def cache(self, max_size):
+        self.cache_size = max_size
+        return self
+
+    def parallel(self, workers=None, chunk_size=50):
+        """
+        Checks rows in a pool of ``workers`` processes, ``chunk_size`` rows at a time.
+        """
+        self.workers = workers
+        self.chunk_size = chunk_size
+        return self
+
+    def incremental(self, manifest_path='.validator-manifest'):
+        """
+        Checks only pairs of files which changed since the last run, errors of the other pairs are taken from
+        the manifest. Url status checks always run in full.
+        """
+        self.manifest = Manifest(manifest_path)
+        return self
+
+    def instrument(self, stats=None, path=None):
+        """
+        Records time and call counts of every stage of the validation in ``stats`` (a new ``Stats`` by default,
+        available as ``self.stats``). With ``path`` the stats are saved there as json after the validation.
+        """
+        self.stats = stats or Stats()
+        if path is not None:
+            self.stats.path = path
+        return self
+
+    def _with_mode(self, check):
+        if self.chunk_size and getattr(check, 'rowwise', False):
+            return checks.ParallelCheck(check, self.workers, self.chunk_size)
+        return check
+
+    def _chain(self):
+        return checks.ChainCheck([self._with_mode(check) for check in self.checks], cache_size=self.cache_size,
+                                 manifest=self.manifest, stats=self.stats)
+
     def report(self):
-        check = checks.ChainCheck(self.checks)
-        return ReportBuilder(self.contents, self.parser, self.reader, check)
+        check = self._chain()
+        return ReportBuilder(self.contents, self.parser, self.reader, check, self.stats)
 
     def validate(self):
-        check = checks.ChainCheck(self.checks)
-        return Validator(self.contents, self.parser, self.reader, check).validate()
+        check = self._chain()
+        return Validator(self.contents, self.parser, self.reader, check, stats=self.stats).validate()
+
+    def iter_validate(self):
+        check = self._chain()
+        return Validator(self.contents, self.parser, self.reader, check, stats=self.stats).iter_validate()
 
     async def async_validate(self):
-        check = checks.ChainCheck(self.checks)
-        res = await Validator(self.contents, self.parser, self.reader, check).async_validate()
+        check = self._chain()
+        res = await Validator(self.contents, self.parser, self.reader, check, stats=self.stats).async_validate()
         return res
 
 
 class ParserBuilder(object):
+    _xml_parsers = {'etree': parsers.XmlParser, 'lxml': parsers.LxmlXmlParser}
+
     def __init__(self, contents, reader=None):
         self.contents = contents
         self.content_type = 'txt'
@@ -105,9 +218,18 @@ class ParserBuilder(object):
         self.parsers.append(parsers.MarkdownParser())
         return self
 
-    def xml(self, query='*'):
+    def xml(self, query='*', key=None, engine='etree', **kwargs):
+        """
+        With ``key`` the elements are compared one by one with the elements of the same ``key`` attribute in the
+        other file instead of comparing all the texts together, e.g. ``xml('string', key='name')``.
+
+        With ``engine='lxml'`` the query is a precompiled XPath and queries selecting elements by tag are parsed
+        without building the whole tree, see ``LxmlXmlParser``.
+        """
+        if engine not in self._xml_parsers:
+            raise ValueError('engine has to be etree or lxml, got {}'.format(engine))
         self.content_type = 'txt'
-        self.parsers.append(parsers.XmlParser(query))
+        self.parsers.append(self._xml_parsers[engine](query, key=key, **kwargs))
         return self
 
     def csv(self):
@@ -121,13 +243,13 @@ class ParserBuilder(object):
 
 
 class ContentBuilder(object):
-    def files(self, pattern, **kwargs):
-        contents = fs.files(pattern, **kwargs)
-        return ParserBuilder(contents, parsers.FileReader())
+    def files(self, pattern, missing='keep', reader=None, **kwargs):
+        contents = fs.files(pattern, missing, **kwargs)
+        return ParserBuilder(contents, reader or parsers.FileReader())
 
-    def file(self, base_path, other_path):
+    def file(self, base_path, other_path, reader=None):
         contents = fs.file(base_path, other_path)
-        return ParserBuilder(contents, parsers.FileReader())
+        return ParserBuilder(contents, reader or parsers.FileReader())
 
     def texts(self, contents):
         contents = [contents]
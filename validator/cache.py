@@ -0,0 +1,235 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from .manifest import digest
+
+
+class ContentStore(object):
+    """
+    Per-run cache of parsed content shared by all checks in a ``ChainCheck``.
+
+    Every file is read and parsed only once, the result is stored under the path together with the file's mtime
+    and size so a file modified during the run is parsed again. The least recently used entries are evicted
+    when the total size of the cached content exceeds ``max_size`` bytes.
+
+    The store takes the place of both the reader and the parser passed to the checks: ``read`` returns already
+    parsed content and ``parse`` returns it unchanged.
+
+    With ``digests`` the digest of the raw content of every loaded file is kept, see ``digest``.
+    """
+    default_max_size = 256 * 1024 * 1024
+
+    def __init__(self, reader, parser, max_size=default_max_size, stats=None, digests=False):
+        self.reader = reader
+        self.parser = parser
+        self.max_size = max_size
+        self.digests = digests
+        self._stats = stats
+        self._digests = {}
+        self._raw = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, path):
+        if not isinstance(path, os.PathLike):
+            return path
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return str(path), None, None
+        return str(path), stat.st_mtime_ns, stat.st_size
+
+    def _add(self, key, content):
+        size = sys.getsizeof(content)
+        if size > self.max_size:
+            return
+        if key in self._entries:
+            # another thread parsed the same file in the meantime
+            self.size -= self._entries.pop(key)[1]
+        self._entries[key] = (content, size)
+        self.size += size
+        while self.size > self.max_size:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def _get(self, key):
+        with self._lock:
+            content, _ = self._entries[key]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return content
+
+    def _read(self, path):
+        if self._stats is None:
+            return self.reader.read(path)
+        with self._stats.timer('read', path):
+            raw = self.reader.read(path)
+        self._stats.increment('bytes_read', len(str(raw).encode('utf-8', 'surrogatepass')))
+        return raw
+
+    def _load(self, path, key=None):
+        with self._lock:
+            raw = self._raw.pop(key, None) if key is not None else None
+        if raw is None:
+            raw = self._read(path)
+            if self.digests and key is not None:
+                with self._lock:
+                    self._digests.setdefault(key, digest(raw))
+        if self._stats is None:
+            return self.parser.parse(raw)
+        with self._stats.timer('parse', path):
+            return self.parser.parse(raw)
+
+    def digest(self, path):
+        """
+        Returns the digest of the raw content of the file. The raw content is kept until the file is parsed or
+        ``release`` is called so the file is read only once.
+        """
+        try:
+            key = self._key(path)
+            with self._lock:
+                if key in self._digests:
+                    return self._digests[key]
+        except TypeError:
+            return digest(self._read(path))
+        raw = self._read(path)
+        content_digest = digest(raw)
+        with self._lock:
+            self._digests[key] = content_digest
+            self._raw[key] = raw
+        return content_digest
+
+    def release(self, paths=None):
+        """
+        Drops the raw content of the paths, or of all files, kept by ``digest``.
+        """
+        with self._lock:
+            if paths is None:
+                self._raw.clear()
+                return
+            for path in paths:
+                try:
+                    self._raw.pop(self._key(path), None)
+                except TypeError:
+                    pass
+
+    def read(self, path):
+        try:
+            key = self._key(path)
+            return self._get(key)
+        except TypeError:
+            # unhashable content can't be cached
+            return self._load(path)
+        except KeyError:
+            pass
+        # parse outside of the lock so checks running in other threads are not blocked
+        content = self._load(path, key)
+        with self._lock:
+            self.misses += 1
+            self._add(key, content)
+        return content
+
+    def parse(self, content):
+        return content
+
+    def __getstate__(self):
+        # copies sent to worker processes start empty
+        state = self.__dict__.copy()
+        state.update(size=0, hits=0, misses=0, _entries=OrderedDict(), _stats=None, _digests={}, _raw={})
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'size': self.size}
+
+
+class LruCache(object):
+    """
+    Small in-memory mapping which keeps only the ``max_entries`` most recently used items.
+    """
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            return default
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def set(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class UrlStatusCache(object):
+    """
+    Persistent cache of url status codes kept in a sqlite database at ``path``.
+
+    Successful (2xx) statuses are reused for ``success_ttl`` seconds and all the other ones for ``failure_ttl``
+    seconds. With ``force_refresh`` every url is checked again and the stored statuses are only updated.
+    """
+
+    def __init__(self, path, success_ttl=24 * 60 * 60, failure_ttl=60 * 60, force_refresh=False):
+        self.path = path
+        self.success_ttl = success_ttl
+        self.failure_ttl = failure_ttl
+        self.force_refresh = force_refresh
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+
+    def _db(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS url_status '
+                                     '(url TEXT PRIMARY KEY, status INTEGER NOT NULL, checked_at REAL NOT NULL)')
+        return self._connection
+
+    def _is_fresh(self, status, checked_at):
+        ttl = self.success_ttl if 200 <= status < 300 else self.failure_ttl
+        return time.time() - checked_at < ttl
+
+    def get(self, url):
+        """
+        Returns the stored status code of the url or None if it needs to be checked.
+        """
+        row = None
+        if not self.force_refresh:
+            row = self._db().execute('SELECT status, checked_at FROM url_status WHERE url = ?', (url, )).fetchone()
+        if row is None or not self._is_fresh(*row):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def set(self, url, status):
+        self._db().execute('INSERT OR REPLACE INTO url_status (url, status, checked_at) VALUES (?, ?, ?)',
+                           (url, status, time.time()))
+
+    def commit(self):
+        if self._connection is not None:
+            self._connection.commit()
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
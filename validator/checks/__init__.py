@@ -1,7 +1,12 @@
+import asyncio
 from typing import Type
+from itertools import islice, repeat
+from concurrent.futures import ProcessPoolExecutor
 
 from sdiff import MdParser
 
+from ..cache import ContentStore
+from ..stats import timer, increment
 from .md import MarkdownComparator
 from .url import UrlValidator, UrlOccurenciesValidator
 from .java import JavaComparator
@@ -18,7 +23,7 @@ def urls(filetype, **kwargs):
 def url_occurences(filetype):
     if filetype != 'txt':
         raise UndefinedCheckTypeError('got filetype %s, expected txt' % filetype)
-    return UrlOccurenciesValidator()
+    return UrlOccurenciesValidator(filetype)
 
 
 def markdown(filetype, md_parser_cls: Type[MdParser] = MdParser):
@@ -34,19 +39,207 @@ def java_args(filetype):
 
 
 class ChainCheck(object):
-    def __init__(self, checks):
+    """
+    Runs the checks one after another on the same contents.
+
+    Every check walks all the rows, so with more than one check the rows are kept in memory for the following
+    checks and memory grows with the number of rows even when errors are streamed with ``iter_check``. Only a
+    single check goes through the contents without keeping them.
+    """
+
+    def __init__(self, checks, cache_size=ContentStore.default_max_size, manifest=None, stats=None):
         self.checks = checks
+        self.cache_size = cache_size
+        self.manifest = manifest
+        self.stats = stats
+        self.store = None
+        self._prefetched = False
+        if stats is not None:
+            # checks with a stats hook time their own stages, like diffs or url requests
+            for check in checks:
+                if hasattr(check, 'stats'):
+                    check.stats = stats
+
+    def _prepare(self, contents, parser, reader):
+        # every check walks the contents, a single pass generator has to be kept for the following checks
+        if len(self.checks) > 1:
+            contents = [list(row) for row in contents or []]
+        self.store = ContentStore(reader, parser, self.cache_size, self.stats, digests=self.manifest is not None)
+        self._prefetched = False
+        return contents
+
+    def _prefetch(self, contents, check=None):
+        """
+        Lets a reader which supports it read the files ahead during the first pass over the contents, following
+        passes get the content from the store. Checks running in worker processes read the files on their own.
+        """
+        prefetch = getattr(self.store.reader, 'prefetch', None)
+        if prefetch is None or self._prefetched or hasattr(check, 'inner_check'):
+            return contents
+        self._prefetched = True
+        return prefetch(contents)
+
+    def _incremental_check(self, check, contents):
+        """
+        Checks only pairs which changed since the last run and takes the errors of the other ones from the manifest.
+        """
+        key = self.manifest.key(getattr(check, 'inner_check', check), self.store.parser)
+        previous = self.manifest.results(key)
+        pairs = []
+        changed = []
+        # raw content is enough to tell if a file changed, the store keeps it for the files which are checked
+        needed = set()
+        # checks in worker processes read the files on their own
+        keep_raw = not hasattr(check, 'inner_check')
+        for row in self._prefetch(contents):
+            base, *others = row
+            for other in others:
+                pair = (str(base), str(other))
+                pair_digest = (self.store.digest(base), self.store.digest(other))
+                pairs.append((pair, pair_digest))
+                if pair not in previous or previous[pair][0] != pair_digest:
+                    changed.append([base, other])
+                    if keep_raw:
+                        needed.update([base, other])
+            self.store.release([path for path in row if path not in needed])
+        increment(self.stats, 'pairs.checked', len(changed))
+        increment(self.stats, 'pairs.reused', len(pairs) - len(changed))
+        changed_errors = check_rows(check, changed, self.store, self.store)
+        self.store.release()
+        checked = {(str(base), str(other)): errors for (base, other), errors in zip(changed, changed_errors)}
+        results = {}
+        errors = []
+        for pair, pair_digest in pairs:
+            pair_errors = checked[pair] if pair in checked else previous[pair][1]
+            results[pair] = (pair_digest, pair_errors)
+            errors.extend(pair_errors)
+        self.manifest.update(key, results)
+        return errors
+
+    def _name(self, check):
+        return type(getattr(check, 'inner_check', check)).__name__
+
+    def _run_check(self, check, contents):
+        if self.manifest is not None and getattr(check, 'rowwise', False):
+            return self._incremental_check(check, contents)
+        return check.check(self._prefetch(contents, check), self.store, self.store)
+
+    def _check(self, check, contents):
+        name = self._name(check)
+        with timer(self.stats, 'check.' + name):
+            errors = self._run_check(check, contents)
+        increment(self.stats, 'errors.' + name, len(errors))
+        return errors
+
+    def _iter_check(self, check, contents):
+        incremental = self.manifest is not None and getattr(check, 'rowwise', False)
+        if incremental or not hasattr(check, 'iter_check'):
+            return self._check(check, contents)
+        errors = check.iter_check(self._prefetch(contents, check), self.store, self.store)
+        if self.stats is None:
+            return errors
+        name = self._name(check)
+        return self.stats.iter('check.' + name, errors, counter='errors.' + name)
+
+    def _finish(self):
+        if self.manifest is not None:
+            self.manifest.save()
+        if self.stats is not None:
+            self.stats.increment('store.hits', self.store.hits)
+            self.stats.increment('store.misses', self.store.misses)
 
     def check(self, contents, parser, reader):
+        contents = self._prepare(contents, parser, reader)
         errors = []
         for check in self.checks:
-            check_errors = check.check(contents, parser, reader)
+            check_errors = self._check(check, contents)
             errors.extend(check_errors)
+        self._finish()
         return errors
 
-    async def async_check(self, contents, parser, reader):
-        errors = []
+    def iter_check(self, contents, parser, reader):
+        """
+        Yields errors as soon as the checks find them. The rows are still kept in memory when there's more than
+        one check.
+        """
+        contents = self._prepare(contents, parser, reader)
         for check in self.checks:
-            check_errors = await check.async_check(contents, parser, reader)
-            errors.extend(check_errors)
+            yield from self._iter_check(check, contents)
+        self._finish()
+
+    async def _async_check(self, check, contents):
+        if getattr(check, 'rowwise', False):
+            # cpu bound checks run in a thread so they don't block network checks waiting on the loop
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, self._check, check, contents)
+        name = self._name(check)
+        with timer(self.stats, 'check.' + name):
+            errors = await check.async_check(contents, self.store, self.store)
+        increment(self.stats, 'errors.' + name, len(errors))
         return errors
+
+    async def async_check(self, contents, parser, reader):
+        contents = self._prepare(contents, parser, reader)
+        # the checks run at the same time, none of them can read ahead for the others
+        self._prefetched = True
+        results = await asyncio.gather(*[self._async_check(check, contents) for check in self.checks])
+        self._finish()
+        return [error for check_errors in results for error in check_errors]
+
+
+def _check_rows(check, rows, parser, reader):
+    return [check.check([row], parser, reader) for row in rows]
+
+
+def check_rows(check, rows, parser, reader):
+    """
+    Returns the list of errors for every row.
+    """
+    if hasattr(check, 'check_rows'):
+        return list(check.check_rows(rows, parser, reader))
+    return _check_rows(check, rows, parser, reader)
+
+
+class ParallelCheck(object):
+    """
+    Runs a check which handles every row on its own in a pool of processes. Rows are sent to the workers in
+    chunks of ``chunk_size`` and the errors are merged back in the order of the rows.
+
+    The check, parser, reader and errors have to be picklable. On platforms which spawn new processes the
+    validation has to be started from under ``if __name__ == '__main__'``.
+    """
+    rowwise = True
+
+    def __init__(self, check, workers=None, chunk_size=50):
+        self.inner_check = check
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def _chunks(self, contents):
+        rows = iter(contents or [])
+        while True:
+            chunk = [list(row) for row in islice(rows, self.chunk_size)]
+            if not chunk:
+                return
+            yield chunk
+
+    def check_rows(self, contents, parser, reader):
+        """
+        Yields the list of errors for every row.
+        """
+        with ProcessPoolExecutor(self.workers) as executor:
+            chunks = executor.map(_check_rows, repeat(self.inner_check), self._chunks(contents), repeat(parser),
+                                  repeat(reader))
+            for chunk_errors in chunks:
+                yield from chunk_errors
+
+    def iter_check(self, contents, parser, reader):
+        for row_errors in self.check_rows(contents, parser, reader):
+            yield from row_errors
+
+    def check(self, contents, parser, reader):
+        return list(self.iter_check(contents, parser, reader))
+
+    async def async_check(self, contents, parser, reader):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.check, contents, parser, reader)
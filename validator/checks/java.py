@@ -1,39 +1,35 @@
 import re
 
 from ..errors import MdDiff, ContentData
+from ..parsers import Entries
 
 ARG_PATTERN = r'%(?:\d+\$)?(?:[a-zA-Z]+)?(?:\d+)?(?:.\d+)?[a-zA-Z]+'
 REF_PATTERN = r'@string/\w+'
 
 
 class JavaComparator(object):
+    rowwise = True
+
     def _get_args(self, content):
         return re.findall(ARG_PATTERN, content)
 
-    def _args_check(self, base, other):
-        base_args = self._get_args(base)
-        other_args = self._get_args(other)
-        if len(base_args) != len(other_args):
-            base_data = ContentData(base, base, '')
-            other_data = ContentData(other, other, '')
-            return MdDiff(base_data, other_data, 'java args do not match')
-        return None
-
-    def _ref_check(self, base, other):
-        if self._has_ref(base):
-            if not self._only_ref(base):
-                base_data = ContentData(base, base, '')
-                other_data = ContentData(other, other, '')
-                return MdDiff(base_data, other_data, 'java args do not match')
-            if not self._only_ref(other):
-                base_data = ContentData(base, base, '')
-                other_data = ContentData(other, other, '')
-                return MdDiff(base_data, other_data, 'java args do not match')
-        elif self._has_ref(other):
-            base_data = ContentData(base, base, '')
-            other_data = ContentData(other, other, '')
-            return MdDiff(base_data, other_data, 'java args do not match')
-        return None
+    def _error(self, base, base_content, other, other_content, name):
+        base_data = ContentData(base, base_content, '')
+        other_data = ContentData(other, other_content, '')
+        msg = 'java args do not match'
+        if name is not None:
+            msg = '{}: {}'.format(name, msg)
+        return MdDiff(base_data, other_data, msg, kind='java')
+
+    def _args_check(self, base_content, other_content):
+        base_args = self._get_args(base_content)
+        other_args = self._get_args(other_content)
+        return len(base_args) == len(other_args)
+
+    def _ref_check(self, base_content, other_content):
+        if self._has_ref(base_content):
+            return self._only_ref(base_content) and self._only_ref(other_content)
+        return not self._has_ref(other_content)
 
     def _only_ref(self, content):
         return re.fullmatch(REF_PATTERN, content) is not None
@@ -41,19 +37,23 @@ class JavaComparator(object):
     def _has_ref(self, content):
         return re.search(REF_PATTERN, content) is not None
 
+    def _pairs(self, base_parsed, other_parsed):
+        # xml entries are checked against the entry of the same name, entries missing on either side are skipped
+        if isinstance(base_parsed, Entries):
+            return [(name, text, other_parsed[name]) for name, text in base_parsed.items() if name in other_parsed]
+        return [(None, str(base_parsed), str(other_parsed))]
+
     def check(self, data, parser, reader):
-        data = data or []
-        errors = []
-        for row in data:
-            row_items = list(map(str, row))
-            base = row_items.pop(0)
-            base_content = parser.parse(reader.read(base))
-            for other in row_items:
-                other_content = parser.parse(reader.read(other))
-                ref_error = self._ref_check(base_content, other_content)
-                if ref_error:
-                    errors.append(ref_error)
-                arg_error = self._args_check(base_content, other_content)
-                if arg_error:
-                    errors.append(arg_error)
-        return errors
+        return list(self.iter_check(data, parser, reader))
+
+    def iter_check(self, data, parser, reader):
+        for row in data or []:
+            base, *others = row
+            base_parsed = parser.parse(reader.read(base))
+            for other in others:
+                other_parsed = parser.parse(reader.read(other))
+                for name, base_content, other_content in self._pairs(base_parsed, other_parsed):
+                    if not self._ref_check(base_content, other_content):
+                        yield self._error(base, base_content, other, other_content, name)
+                    if not self._args_check(base_content, other_content):
+                        yield self._error(base, base_content, other, other_content, name)
@@ -1,10 +1,14 @@
 import re
 from typing import Type
+from functools import partial
 
 from sdiff import diff, renderer, MdParser
-from markdown import markdown
 
 from ..errors import MdDiff, ContentData
+from ..cache import LruCache
+from ..parsers import Entries
+from ..stats import timer
+from ..render import markdown
 
 LINK_RE = r'\]\(([^\)]+)\)'
 
@@ -14,34 +18,138 @@ def save_file(content, filename):
         fp.write(content)
 
 
+class _NullRenderer(object):
+    # errors are found on the structure alone, the diff is rendered only for the reported errors
+    def render(self, node):
+        return ''
+
+
+class _PairDiff(object):
+    """
+    Html diff of a pair of texts, it's diffed again with the html renderer when either side is used.
+    """
+
+    def __init__(self, other_parsed, base_parsed, md_parser_cls):
+        self.other_parsed = other_parsed
+        self.base_parsed = base_parsed
+        self.md_parser_cls = md_parser_cls
+        self._rendered = None
+
+    def _render(self):
+        if self._rendered is None:
+            other_diff, base_diff, _ = diff(self.other_parsed, self.base_parsed, renderer=renderer.HtmlRenderer(),
+                                            parser_cls=self.md_parser_cls)
+            self._rendered = (other_diff, base_diff)
+        return self._rendered
+
+    def other(self):
+        return self._render()[0]
+
+    def base(self):
+        return self._render()[1]
+
+
+def _join_diffs(diffs):
+    return '\n'.join(render() for render in diffs)
+
+
 class MarkdownComparator(object):
+    # every row is checked on its own so rows can be split between workers
+    rowwise = True
+    # set by ChainCheck when the validation is instrumented
+    stats = None
+    entry_diffs_cache_size = 1024
+
     def __init__(self, md_parser_cls: Type[MdParser] = MdParser):
         self._md_parser_cls = md_parser_cls
+        # rows checked pair by pair share the base, it's rendered only once
+        self._base_html = LruCache()
+        # xml entries repeat across files and locales, errors of each pair of texts are found once
+        self._entry_diffs = LruCache(self.entry_diffs_cache_size)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_base_html']
+        del state['_entry_diffs']
+        state.pop('stats', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._base_html = LruCache()
+        self._entry_diffs = LruCache(self.entry_diffs_cache_size)
+
+    def _render_base(self, base_parsed):
+        base_html = self._base_html.get(base_parsed)
+        if base_html is None:
+            base_html = markdown(base_parsed)
+            self._base_html.set(base_parsed, base_html)
+        return base_html
 
     def check(self, data, parser, reader):
-        if not data:
-            return []
+        return list(self.iter_check(data, parser, reader))
 
-        # TODO use yield instead of array
-        errors = []
-        for row in data:
-            base = row.pop(0)
+    def _diff(self, other_parsed, base_parsed, path):
+        with timer(self.stats, 'sdiff.diff', path):
+            _, _, error = diff(other_parsed, base_parsed, renderer=_NullRenderer(), parser_cls=self._md_parser_cls)
+        return [e.message for e in error]
+
+    def _compare(self, base, base_parsed, other, other_parsed):
+        error_msgs = self._diff(other_parsed, base_parsed, other)
+        if not error_msgs:
+            return None
+        pair_diff = _PairDiff(other_parsed, base_parsed, self._md_parser_cls)
+        base_data = ContentData(base, base_parsed, pair_diff.base, partial(self._render_base, base_parsed))
+        other_data = ContentData(other, other_parsed, pair_diff.other, partial(markdown, other_parsed))
+        return MdDiff(base_data, other_data, error_msgs)
+
+    def _entry_diff(self, base_text, other_text, other):
+        key = (base_text, other_text)
+        result = self._entry_diffs.get(key)
+        if result is None:
+            result = self._diff(other_text, base_text, other)
+            self._entry_diffs.set(key, result)
+        return result
+
+    def _compare_entries(self, base, base_entries, other, other_entries):
+        """
+        Diffs the entries of the same name one by one, entries missing on either side are not compared. The
+        entries with errors are reported together as a single error of the file.
+        """
+        failed = []
+        for name, base_text in base_entries.items():
+            other_text = other_entries.get(name)
+            # same texts can't differ in structure
+            if other_text is None or other_text == base_text:
+                continue
+            error_msgs = self._entry_diff(base_text, other_text, other)
+            if error_msgs:
+                failed.append((name, base_text, other_text, error_msgs))
+        if not failed:
+            return None
+        names, base_texts, other_texts, entry_msgs = zip(*failed)
+        pair_diffs = [_PairDiff(other_text, base_text, self._md_parser_cls)
+                      for base_text, other_text in zip(base_texts, other_texts)]
+        base_parsed, other_parsed = '\n\n'.join(base_texts), '\n\n'.join(other_texts)
+        error_msgs = ['{}: {}'.format(name, msg) for name, msgs in zip(names, entry_msgs) for msg in msgs]
+        base_data = ContentData(base, base_parsed, partial(_join_diffs, [pair.base for pair in pair_diffs]),
+                                partial(markdown, base_parsed))
+        other_data = ContentData(other, other_parsed, partial(_join_diffs, [pair.other for pair in pair_diffs]),
+                                 partial(markdown, other_parsed))
+        return MdDiff(base_data, other_data, error_msgs)
+
+    def iter_check(self, data, parser, reader):
+        for row in data or []:
+            base, *others = row
             base_parsed = parser.parse(reader.read(base))
-            base_html = markdown(base_parsed)
-            for other in row:
+            for other in others:
                 other_parsed = parser.parse(reader.read(other))
-                other_html = markdown(other_parsed)
-                other_diff, base_diff, error = diff(other_parsed, base_parsed,
-                                                    renderer=renderer.HtmlRenderer(),
-                                                    parser_cls=self._md_parser_cls)
+                if isinstance(base_parsed, Entries):
+                    error = self._compare_entries(base, base_parsed, other, other_parsed)
+                else:
+                    error = self._compare(base, base_parsed, other, other_parsed)
                 if error:
-                    error_msgs = []
-                    if error:
-                        error_msgs = map(lambda e: e.message, error)
-                    base_data = ContentData(base, base_parsed, base_diff, base_html)
-                    other_data = ContentData(other, other_parsed, other_diff, other_html)
-                    errors.append(MdDiff(base_data, other_data, error_msgs))
-        return errors
+                    yield error
 
     def get_broken_links(self, base, other):
         base_links = re.findall(LINK_RE, base)
@@ -1,13 +1,21 @@
 import re
+import time
+import random
+import socket
 import logging
 import asyncio
 import aiohttp
 import string
+from collections import deque, namedtuple
+from email.utils import parsedate_to_datetime
 from bs4 import BeautifulSoup
+from lxml import etree
 from urllib.parse import urlparse, urljoin
 from typing import List, Optional
 
 from ..errors import UrlDiff, UrlOccurencyDiff
+from ..cache import LruCache
+from ..stats import timer, increment
 
 logging.getLogger('aiohttp').setLevel(logging.ERROR)
 logging.getLogger('asyncio').setLevel(logging.ERROR)
@@ -48,6 +56,63 @@ class TextUrlExtractor(object):
             return [self._strip_non_ascii_chars(value) for value in result]
 
 
+# every url matched by TextUrlExtractor.url_pattern starts with one of these, in any case
+URL_PREFIXES = ('http', 'www', '!keep')
+PARAM_PATTERN = re.compile(r'\{[a-zA-Z0-9_.]+\}')
+# ascii characters missing from string.printable, the other ones are dropped when encoding to ascii
+NON_PRINTABLE_ASCII = {code: None for code in range(128) if chr(code) not in string.printable}
+
+
+class CompiledTextUrlExtractor(TextUrlExtractor):
+    """
+    Gives the same results as TextUrlExtractor. Instead of trying the url pattern at every position it only
+    tries it where one of the url prefixes starts, text without any prefix is skipped right away. Urls are
+    stripped with a translate table instead of checking every character.
+    """
+    compiled_url_pattern = re.compile(TextUrlExtractor.url_pattern)
+
+    def _without_params(self, url):
+        return PARAM_PATTERN.search(url) is None
+
+    def _strip_non_ascii_chars(self, url):
+        return url.encode('ascii', 'ignore').decode('ascii').translate(NON_PRINTABLE_ASCII)
+
+    def _prefix_positions(self, lowered):
+        positions = []
+        for prefix in URL_PREFIXES:
+            position = lowered.find(prefix)
+            while position != -1:
+                positions.append(position)
+                position = lowered.find(prefix, position + 1)
+        return sorted(positions)
+
+    def _matches(self, content):
+        lowered = content.lower()
+        if len(lowered) != len(content):
+            # some characters changed length when lowered, positions wouldn't match the content
+            yield from self.compiled_url_pattern.finditer(content)
+            return
+        end = 0
+        for position in self._prefix_positions(lowered):
+            if position < end:
+                continue
+            match = self.compiled_url_pattern.match(content, position)
+            if match:
+                end = match.end()
+                yield match
+
+    def extract_urls(self, content, unique=True, strip_placeholders=True):
+        if not content:
+            return []
+        result = [match.group().strip(').') for match in self._matches(content)]
+        if unique:
+            result = set(result)
+        result = [self._strip_non_ascii_chars(value) for value in result]
+        if strip_placeholders:
+            return [value for value in result if self._without_params(value)]
+        return result
+
+
 class HtmlUrlExtractor(TextUrlExtractor):
     def __init__(self, root_url='', skip_images=False, **kwargs):
         self.root_url = root_url
@@ -65,30 +130,37 @@ class HtmlUrlExtractor(TextUrlExtractor):
     def _extract_from_img(self, soup):
         if self.skip_images:
             return set()
-        return set([img.get('src') for img in soup.find_all('img')])
+        return set([img.get('src') for img in soup.find_all('img') if img.get('src')])
+
+    def _is_url(self, url):
+        return re.match(self.url_pattern, url)
 
     def _fix_url(self, url):
         result = ''
         url_parsed = urlparse(url)
-        if url_parsed.geturl().startswith('/'):
+        normalized = url_parsed.geturl()
+        if normalized.startswith('/'):
             if self.root_url:
-                result = urljoin(self.root_url, url_parsed.geturl())
+                result = urljoin(self.root_url, normalized)
         elif url_parsed.scheme in ['http', 'https']:
-            if re.match(self.url_pattern, url_parsed.geturl()):
-                result = url_parsed.geturl()
+            if self._is_url(normalized):
+                result = normalized
         elif not url_parsed.scheme:
-            if not self._validate_email(url_parsed.geturl()):
-                full_url = 'http://' + url_parsed.geturl()
-                if re.match(self.url_pattern, full_url):
+            if not self._validate_email(normalized):
+                full_url = 'http://' + normalized
+                if self._is_url(full_url):
                     result = full_url
         else:
-            logging.error('{} not tested'.format(url_parsed.geturl()))
+            logging.error('{} not tested'.format(normalized))
         return result
 
+    def _collect_urls(self, content):
+        soup = BeautifulSoup(content, 'lxml')
+        return self._extract_from_anchors(soup) | self._extract_from_img(soup)
+
     def extract_urls(self, content, keep_placeholders=False):
         result = []
-        soup = BeautifulSoup(content, 'lxml')
-        urls = self._extract_from_anchors(soup) | self._extract_from_img(soup)
+        urls = self._collect_urls(content)
         for url in urls:
             fixed_url = self._fix_url(url)
             if fixed_url and (self._without_params(fixed_url) or keep_placeholders):
@@ -96,39 +168,268 @@ class HtmlUrlExtractor(TextUrlExtractor):
         return result
 
 
+class _LinkCollector(object):
+    """
+    ``lxml.etree.HTMLParser`` target collecting anchor hrefs (or their text) and image sources.
+    """
+    # the soup doesn't include text of these tags in the text of the anchor
+    skipped_text_tags = ('script', 'style', 'template', 'rt', 'rp')
+
+    def __init__(self, skip_images):
+        self.skip_images = skip_images
+        self.urls = set()
+        self._anchors = []
+        self._skipped_text = 0
+
+    def start(self, tag, attrib):
+        if tag in self.skipped_text_tags:
+            self._skipped_text += 1
+        elif tag == 'a':
+            self._anchors.append((attrib.get('href'), []))
+        elif tag == 'img' and not self.skip_images and attrib.get('src'):
+            self.urls.add(attrib['src'])
+
+    def end(self, tag):
+        if tag in self.skipped_text_tags:
+            self._skipped_text -= 1
+        elif tag == 'a' and self._anchors:
+            href, text = self._anchors.pop()
+            self.urls.add(href or ''.join(text))
+
+    def data(self, data):
+        if self._skipped_text:
+            return
+        # nested anchors share the text, same as the text of a tag in the soup
+        for _, text in self._anchors:
+            text.append(data)
+
+    def close(self):
+        return self.urls
+
+
+class StreamingHtmlUrlExtractor(HtmlUrlExtractor, CompiledTextUrlExtractor):
+    """
+    Gives the same results as HtmlUrlExtractor without building a BeautifulSoup tree, the urls are collected
+    from the lxml parser events.
+    """
+
+    def _is_url(self, url):
+        return self.compiled_url_pattern.match(url)
+
+    def _collect_urls(self, content):
+        if not content:
+            return set()
+        parser = etree.HTMLParser(target=_LinkCollector(self.skip_images), recover=True)
+        parser.feed(content)
+        return parser.close()
+
+
+class TokenBucket(object):
+    """
+    Allows ``rate`` acquisitions per second on average with bursts of up to ``capacity`` acquisitions.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class UrlScheduler(object):
+    """
+    Runs url probes with at most ``max_concurrency`` requests in flight and, if ``host_rate_limit`` is set,
+    at most that many requests per second to a single host. Results are yielded as soon as they are ready.
+    """
+
+    def __init__(self, max_concurrency=50, host_rate_limit=None, host_burst=None):
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency has to be at least 1, got {}'.format(max_concurrency))
+        self.max_concurrency = max_concurrency
+        self.host_rate_limit = host_rate_limit
+        self.host_burst = host_burst
+
+    async def _throttle(self, buckets, url):
+        if not self.host_rate_limit:
+            return
+        host = urlparse(url).netloc
+        bucket = buckets.get(host)
+        if bucket is None:
+            bucket = buckets[host] = TokenBucket(self.host_rate_limit, self.host_burst)
+        await bucket.acquire()
+
+    async def run(self, urls, probe):
+        pending = deque(urls)
+        total = len(pending)
+        results = asyncio.Queue()
+        buckets = {}
+
+        async def worker():
+            while pending:
+                url = pending.popleft()
+                try:
+                    await self._throttle(buckets, url.url)
+                    await probe(url)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # the worker carries on with the other urls, the url is reported as failed
+                    logging.error('Error checking %s: %s', url.url, e)
+                    url.failure = _failure_kind(e)
+                finally:
+                    results.put_nowait(url)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(self.max_concurrency, total))]
+        try:
+            for _ in range(total):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+
+
+UrlResponse = namedtuple('UrlResponse', ['status_code', 'failure', 'retry_after'])
+UrlResponse.__new__.__defaults__ = (None, None)
+
+
+class RetryPolicy(object):
+    """
+    Decides which url responses are retried and how long to wait before the next attempt.
+
+    ``max_count`` is the total number of attempts. The delay grows exponentially from ``backoff`` seconds up to
+    ``max_backoff`` with up to ``jitter`` of it added at random, a ``Retry-After`` header takes precedence
+    (up to ``max_retry_after`` seconds). ``timeout`` limits a single attempt.
+    """
+
+    def __init__(self, max_count=3, backoff=0.25, max_backoff=30, jitter=0.5, timeout=30,
+                 retry_statuses=(429, 500, 502, 503, 504), retry_failures=('timeout', 'connection'),
+                 respect_retry_after=True, max_retry_after=60):
+        self.max_count = max_count
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.timeout = timeout
+        self.retry_statuses = retry_statuses
+        self.retry_failures = retry_failures
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def should_retry(self, response, attempt):
+        if attempt >= self.max_count:
+            return False
+        if response.failure is not None:
+            return response.failure in self.retry_failures
+        return response.status_code in self.retry_statuses
+
+    def delay(self, response, attempt):
+        if self.respect_retry_after and response.retry_after is not None:
+            return min(response.retry_after, self.max_retry_after)
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        return delay + random.uniform(0, self.jitter * delay)
+
+
+def _parse_retry_after(value):
+    if not isinstance(value, str):
+        return None
+    if value.strip().isdigit():
+        return int(value)
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _failure_kind(error):
+    if isinstance(error, asyncio.TimeoutError):
+        return 'timeout'
+    if isinstance(error, aiohttp.ClientConnectorError) and isinstance(error.os_error, socket.gaierror):
+        return 'dns'
+    if isinstance(error, (aiohttp.ClientConnectionError, ConnectionError)):
+        return 'connection'
+    return 'error'
+
+
 class UrlStatusChecker(object):
     retry_max_count = 3
+    drain_max_size = 64 * 1024
 
-    def __init__(self, headers=None, exclude_urls_regexs: Optional[List[str]] = None):
+    def __init__(self, headers=None, exclude_urls_regexs: Optional[List[str]] = None,
+                 connection_limit=100, connection_limit_per_host=10, dns_cache_ttl=300,
+                 max_concurrency=50, host_rate_limit=None, host_burst=None, status_cache=None, head_first=False,
+                 retry_policy=None, stats=None):
         self._exclude_urls_regex = exclude_urls_regexs or []
         if self._exclude_urls_regex:
             logging.warning('Excluded urls regexps: {}'.format(self._exclude_urls_regex))
         self._headers = headers or {}
         if 'User-Agent' not in self._headers:
             self._headers['User-Agent'] = DEFAULT_USER_AGENT
-
-    async def _make_request(self, url):
+        self._connection_limit = connection_limit
+        self._connection_limit_per_host = connection_limit_per_host
+        self._dns_cache_ttl = dns_cache_ttl
+        self._scheduler = UrlScheduler(max_concurrency, host_rate_limit, host_burst)
+        self._status_cache = status_cache
+        self._head_first = head_first
+        self._retry_policy = retry_policy or RetryPolicy(max_count=self.retry_max_count)
+        self._stats = stats
+
+    def _session(self):
+        # one session per check run so connections, dns lookups and tls sessions are reused between urls
+        connector = aiohttp.TCPConnector(limit=self._connection_limit,
+                                         limit_per_host=self._connection_limit_per_host,
+                                         ttl_dns_cache=self._dns_cache_ttl)
+        return aiohttp.ClientSession(connector=connector)
+
+    async def _status(self, session, method, url):
+        async with session.request(method, url, headers=self._headers, allow_redirects=True) as res:
+            if method == 'get':
+                # only the status is needed, small bodies are read so the connection goes back to the pool, the
+                # connection is dropped instead of downloading large bodies or ones of unknown length
+                if res.content_length is not None and res.content_length <= self.drain_max_size:
+                    await res.read()
+                else:
+                    res.close()
+            retry_after = None
+            if res.status in (429, 503):
+                retry_after = _parse_retry_after(res.headers.get('Retry-After'))
+            return UrlResponse(res.status, retry_after=retry_after)
+
+    async def _send(self, session, method, url):
         try:
-            logging.info('checking {}'.format(url))
-            async with aiohttp.request('get', url, headers=self._headers, allow_redirects=True) as res:
-                return res.status
-        except Exception:
-            logging.error('Error making request to %s', url)
-            return 500
-
-    async def _retry_request(self, url, status):
-        new_status = status
-        times = 1
-        while times < self.retry_max_count and status == new_status:
-            new_status = await self._make_request(url)
-            times = times + 1
-        return new_status
-
-    async def _request_status_code(self, url):
-        status = await self._make_request(url)
-        if status == 500:
-            return await self._retry_request(url, status)
-        return status
+            logging.info('checking {} with {}'.format(url, method))
+            return await asyncio.wait_for(self._status(session, method, url), self._retry_policy.timeout)
+        except Exception as e:
+            failure = _failure_kind(e)
+            logging.error('Error making request to %s: %s', url, failure)
+            return UrlResponse(None, failure)
+
+    async def _make_request(self, session, url):
+        if self._head_first:
+            response = await self._send(session, 'head', url)
+            # some servers don't implement HEAD or answer it differently than GET, only trust a success
+            if response.status_code is not None and 200 <= response.status_code < 300:
+                return response
+        return await self._send(session, 'get', url)
+
+    async def _request_status_code(self, session, url):
+        attempt = 1
+        response = await self._make_request(session, url)
+        while self._retry_policy.should_retry(response, attempt):
+            await asyncio.sleep(self._retry_policy.delay(response, attempt))
+            attempt = attempt + 1
+            response = await self._make_request(session, url)
+        return response
 
     def _has_disallowed_chars(self, url):
         return url.find('\u200e') != -1
@@ -136,22 +437,79 @@ class UrlStatusChecker(object):
     def _is_valid(self, status_code, has_disallowed_chars):
         return (200 <= status_code < 300) and not has_disallowed_chars
 
-    async def _check_urls_coro(self, urls, future):
-        urls_without_excluded = []
+    async def _probe(self, session, url):
+        # wall time of the request including retries and waiting for a connection
+        with timer(self._stats, 'url.probe', url.url):
+            response = await self._request_status_code(session, url.url)
+        increment(self._stats, 'url.probed')
+        if response.failure is not None:
+            increment(self._stats, 'url.failed')
+        url.status_code = response.status_code
+        url.failure = response.failure
+        url.has_disallowed_chars = self._has_disallowed_chars(url.url)
+        # network failures are transient, only http statuses are worth keeping between runs
+        if self._status_cache is not None and url.failure is None:
+            self._status_cache.set(url.url, url.status_code)
+
+    def _from_cache(self, url):
+        if self._status_cache is None:
+            return False
+        status = self._status_cache.get(url.url)
+        if status is None:
+            return False
+        increment(self._stats, 'url.cache_hits')
+        url.status_code = status
+        url.has_disallowed_chars = self._has_disallowed_chars(url.url)
+        return True
+
+    async def iter_check(self, urls):
+        """
+        Yields invalid urls in the order their checks finish.
+        """
+        urls_to_request = []
         for url in urls:
             is_exluded = any(re.match(regex, url.url) for regex in self._exclude_urls_regex)
-            if not is_exluded:
-                urls_without_excluded.append(url)
-            else:
+            if is_exluded:
                 logging.warning('url {} excluded from status check'.format(url.url))
-        tasks = [self._request_status_code(url.url) for url in urls_without_excluded]
-        results = await asyncio.gather(*tasks)
-        for index, url in enumerate(urls_without_excluded):
-            url.status_code = results[index]
-            url.has_disallowed_chars = self._has_disallowed_chars(url.url)
+            elif self._from_cache(url):
+                if not url.is_valid():
+                    yield url
+            else:
+                urls_to_request.append(url)
+        if not urls_to_request:
+            return
+        try:
+            async with self._session() as session:
+                async for url in self._scheduler.run(urls_to_request, lambda u: self._probe(session, u)):
+                    if not url.is_valid():
+                        yield url
+        finally:
+            if self._status_cache is not None:
+                self._status_cache.commit()
+
+    async def _check_urls_coro(self, urls, future):
+        async for _ in self.iter_check(urls):
+            pass
         invalid_urls = filter(lambda u: not u.is_valid(), urls)
         future.set_result(list(invalid_urls))
 
+    def stream(self, urls):
+        """
+        Synchronous version of ``iter_check``.
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        invalid_urls = self.iter_check(urls)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(invalid_urls.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            loop.run_until_complete(invalid_urls.aclose())
+            loop.close()
+
     def check(self, urls):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
@@ -168,52 +526,120 @@ class UrlStatusChecker(object):
 
 
 class UrlValidator(object):
-    _extractors = {'txt': TextUrlExtractor, 'html': HtmlUrlExtractor}
-
-    def __init__(self, filetype, headers=None, exclude_status_check_regexs: Optional[List[str]] = None, **kwargs):
+    # urls are collected from all rows before they are checked
+    rowwise = False
+    # set by ChainCheck when the validation is instrumented
+    stats = None
+    _extractors = {
+        'txt': {'default': TextUrlExtractor, 'fast': CompiledTextUrlExtractor},
+        'html': {'default': HtmlUrlExtractor, 'fast': StreamingHtmlUrlExtractor},
+    }
+
+    def __init__(self, filetype, headers=None, exclude_status_check_regexs: Optional[List[str]] = None,
+                 connection_limit=100, connection_limit_per_host=10, dns_cache_ttl=300,
+                 max_concurrency=50, host_rate_limit=None, host_burst=None, status_cache=None, head_first=False,
+                 retry_policy=None, extractor='default', **kwargs):
         self.client_headers = headers or {}
         self._excluded_status_check_regexs = exclude_status_check_regexs or []
-        extractor_class = self._extractors.get(filetype)
+        self._checker_options = {
+            'connection_limit': connection_limit,
+            'connection_limit_per_host': connection_limit_per_host,
+            'dns_cache_ttl': dns_cache_ttl,
+            'max_concurrency': max_concurrency,
+            'host_rate_limit': host_rate_limit,
+            'host_burst': host_burst,
+            'status_cache': status_cache,
+            'head_first': head_first,
+            'retry_policy': retry_policy,
+        }
+        extractor_class = self._extractors.get(filetype, {}).get(extractor)
         if extractor_class is None:
-            raise MissingUrlExtractorError('no extractor for filetype %s', filetype)
+            raise MissingUrlExtractorError('no %s extractor for filetype %s' % (extractor, filetype))
         self.extractor = extractor_class(**kwargs)
 
     def _get_urls(self, data, parser, reader):
-        flat_data = set(p for sublist in data for p in sublist)
-        # TODO yield instead
+        # files are read in the order of the rows so a reader can read them ahead
         urls = {}
-        for element in flat_data:
-            content = parser.parse(reader.read(element))
-            file_urls = self.extractor.extract_urls(content)
-            for file_url in file_urls:
-                url = urls.get(file_url, UrlDiff(file_url))
-                url.add_file(element)
-                urls[url.url] = url
+        seen = set()
+        for row in data:
+            for element in row:
+                if element in seen:
+                    continue
+                seen.add(element)
+                content = parser.parse(reader.read(element))
+                self._add_urls(urls, element, content)
+        return urls
+
+    def _add_urls(self, urls, element, content):
+        # entries of an xml file are searched as a single text
+        file_urls = self.extractor.extract_urls(str(content))
+        for file_url in file_urls:
+            url = urls.get(file_url, UrlDiff(file_url))
+            url.add_file(element)
+            urls[url.url] = url
         return urls
 
+    def _checker(self):
+        return UrlStatusChecker(headers=self.client_headers, exclude_urls_regexs=self._excluded_status_check_regexs,
+                                stats=self.stats, **self._checker_options)
+
     def check(self, data, parser, reader):
         urls = self._get_urls(data, parser, reader)
-        checker = UrlStatusChecker(headers=self.client_headers, exclude_urls_regexs=self._excluded_status_check_regexs)
+        checker = self._checker()
         invalid_urls = checker.check(urls.values())
         return invalid_urls
 
-    async def async_check(self, data, parser, reader):
+    def iter_check(self, data, parser, reader):
         urls = self._get_urls(data, parser, reader)
-        checker = UrlStatusChecker(headers=self.client_headers, exclude_urls_regexs=self._excluded_status_check_regexs)
+        yield from self._checker().stream(urls.values())
+
+    async def async_check(self, data, parser, reader):
+        loop = asyncio.get_event_loop()
+        urls = await loop.run_in_executor(None, self._get_urls, data, parser, reader)
+        checker = self._checker()
         invalid_urls = await checker.async_check(urls.values())
         return invalid_urls
 
 
 class UrlOccurenciesValidator(UrlValidator):
-    def check(self, data, parser, reader):
-        error = []
+    rowwise = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # rows checked pair by pair share the base, its urls are extracted only once
+        self._base_urls = LruCache()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_base_urls']
+        state.pop('stats', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._base_urls = LruCache()
+
+    def _get_base_urls(self, base, parser, reader):
+        content = str(parser.parse(reader.read(base)))
+        key = (str(base), content)
+        base_urls = self._base_urls.get(key)
+        if base_urls is None:
+            base_urls = self._add_urls({}, base, content)
+            self._base_urls.set(key, base_urls)
+        return base_urls
+
+    def iter_check(self, data, parser, reader):
         for row in data:
-            base = row.pop(0)
-            base_urls = self._get_urls([[base]], parser, reader)
-            for other in row:
+            base, *others = row
+            base_urls = self._get_base_urls(base, parser, reader)
+            for other in others:
                 other_urls = self._get_urls([[other]], parser, reader)
-                error.append(UrlOccurencyDiff(base, other, base_urls, other_urls))
-        return [x for x in error if not x.is_valid()]
+                error = UrlOccurencyDiff(base, other, base_urls, other_urls)
+                if not error.is_valid():
+                    yield error
+
+    def check(self, data, parser, reader):
+        return list(self.iter_check(data, parser, reader))
 
     def async_check(self, *args):
         raise NotImplementedError
@@ -1,28 +1,54 @@
-from collections import namedtuple
+from collections import OrderedDict
+
+
+def _paths(*paths):
+    return [str(path) for path in paths]
 
 
 class UrlDiff(object):
+    kind = 'url'
 
-    def __init__(self, url, files=None, status_code=200, has_disallowed_chars=False):
+    def __init__(self, url, files=None, status_code=200, has_disallowed_chars=False, failure=None):
         self.url = url
         self.files = files or []
         self.status_code = status_code
         self.has_disallowed_chars = has_disallowed_chars
+        # kind of network failure (timeout, dns, connection, error) when no status code was received
+        self.failure = failure
 
     def __str__(self):
-        return 'Url(%s, %s, %s, %s)' % (self.url, self.files, self.status_code, self.has_disallowed_chars)
+        return 'Url(%s, %s, %s, %s, %s)' % (self.url, self.files, self.status_code, self.has_disallowed_chars,
+                                            self.failure)
 
     def __repr__(self):
         return 'Url: %s' % self.url
 
     def is_valid(self):
-        return 200 <= self.status_code < 300 and not self.has_disallowed_chars
+        return self.failure is None and 200 <= self.status_code < 300 and not self.has_disallowed_chars
+
+    def message(self):
+        if self.failure is not None:
+            return '{} failed with {} error'.format(self.url, self.failure)
+        return '{} returned with code {}'.format(self.url, self.status_code)
 
     def add_file(self, path):
         self.files.append(path)
 
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'files': _paths(*self.files),
+            'url': self.url,
+            'status_code': self.status_code,
+            'failure': self.failure,
+            'has_disallowed_chars': self.has_disallowed_chars,
+            'error_msgs': [self.message()],
+        }
+
 
 class UrlOccurencyDiff:
+    kind = 'url_occurences'
+
     def __init__(self, base_file, translated_file, base_urls, translation_urls):
         self.base_path = base_file
         self.translation_path = translated_file
@@ -32,14 +58,101 @@ class UrlOccurencyDiff:
     def is_valid(self):
         return self.base_occurences.keys() == self.translation_occurences.keys()
 
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'files': _paths(self.base_path, self.translation_path),
+            'base_urls': sorted(self.base_occurences),
+            'translation_urls': sorted(self.translation_occurences),
+            'error_msgs': ['Count of URLS in %s and %s are different' % (self.base_path, self.translation_path)],
+        }
+
+
+class ContentData(object):
+    """
+    Content of a file compared by a check. ``diff`` and ``html`` are strings or callables which render them the first
+    time they are used, so checks don't render content of files without errors. Pickled content is rendered first.
+
+    It has the same api as the namedtuple it used to be, indexing or comparing it renders the content.
+    """
+    _fields = ('original', 'parsed', 'diff', 'html')
+
+    def __init__(self, original, parsed, diff='', html=''):
+        self.original = original
+        self.parsed = parsed
+        self._diff = diff
+        self._html = html
+
+    @property
+    def diff(self):
+        if callable(self._diff):
+            self._diff = self._diff()
+        return self._diff
+
+    @property
+    def html(self):
+        if callable(self._html):
+            self._html = self._html()
+        return self._html
 
-ContentData = namedtuple('ContentData', ['original', 'parsed', 'diff', 'html'])
-ContentData.__new__.__defaults__ = ('', ) * 2
+    def __iter__(self):
+        return iter([self.original, self.parsed, self.diff, self.html])
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __getitem__(self, index):
+        return tuple(self)[index]
+
+    def __eq__(self, other):
+        if not isinstance(other, (ContentData, tuple)):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        fields = ', '.join('{}={!r}'.format(name, value) for name, value in zip(self._fields, self))
+        return 'ContentData({})'.format(fields)
+
+    @classmethod
+    def _make(cls, iterable):
+        values = tuple(iterable)
+        if len(values) != len(cls._fields):
+            raise TypeError('Expected {} arguments, got {}'.format(len(cls._fields), len(values)))
+        return cls(*values)
+
+    def _asdict(self):
+        return OrderedDict(zip(self._fields, self))
+
+    def _replace(self, **kwargs):
+        # pending content stays pending in the copy
+        values = dict(original=self.original, parsed=self.parsed, diff=self._diff, html=self._html)
+        unknown = kwargs.keys() - values.keys()
+        if unknown:
+            raise ValueError('Got unexpected field names: {!r}'.format(sorted(unknown)))
+        values.update(kwargs)
+        return ContentData(**values)
+
+    def __getstate__(self):
+        return {'original': self.original, 'parsed': self.parsed, '_diff': self.diff, '_html': self.html}
 
 
 class MdDiff(object):
+    # errors of the previous runs kept in a manifest were saved without the kind
+    kind = 'markdown'
 
-    def __init__(self, base, other, error_msgs):
+    def __init__(self, base, other, error_msgs, kind='markdown'):
         self.base = base
         self.other = other
         self.error_msgs = error_msgs
+        self.kind = kind
+
+    def as_dict(self):
+        error_msgs = [self.error_msgs] if isinstance(self.error_msgs, str) else self.error_msgs
+        return {
+            'kind': self.kind,
+            'files': _paths(self.base.original, self.other.original),
+            'error_msgs': [str(msg) for msg in error_msgs],
+        }
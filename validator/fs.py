@@ -1,7 +1,8 @@
+import os
+import re
+import hashlib
 from pathlib import Path
 from string import Formatter
-from collections import defaultdict
-import parse
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,64 +17,214 @@ def read_content(path):
         return ''
 
 
-def save_report(directory, source_path, report):
+def report_path(directory, source_path):
     rel_path = Path(str(source_path).replace('../', ''))
-    path = Path(directory).joinpath(rel_path.with_suffix('.html'))
+    return Path(directory).joinpath(rel_path.with_suffix('.html'))
+
+
+def _same_content(path, content):
+    try:
+        if path.stat().st_size != len(content):
+            return False
+        with path.open('rb') as fp:
+            saved = fp.read()
+    except OSError:
+        return False
+    return hashlib.sha1(saved).digest() == hashlib.sha1(content).digest()
+
+
+def save_report(directory, source_path, report, incremental=False):
+    """
+    Saves the report as utf-8 and returns its path. With ``incremental`` a report already saved with the same
+    content isn't written again so the file is left untouched.
+    """
+    path = report_path(directory, source_path)
+    content = report.encode('utf-8')
+    if incremental and _same_content(path, content):
+        return path
     try:
         path.parent.mkdir(parents=True)
     except FileExistsError:
         pass
-    with path.open('w') as fp:
-        fp.write(report)
+    with path.open('wb') as fp:
+        fp.write(content)
+    return path
+
+
+def remove_stale_reports(directory, reports):
+    """
+    Removes the html files in the directory which aren't one of the ``reports`` paths and the directories left
+    empty.
+    """
+    keep = {Path(path) for path in reports}
+    for dirpath, dirnames, filenames in os.walk(str(directory), topdown=False):
+        for filename in filenames:
+            path = Path(dirpath, filename)
+            if path.suffix == '.html' and path not in keep:
+                path.unlink()
+        if dirpath != str(directory) and not os.listdir(dirpath):
+            os.rmdir(dirpath)
 
 
 def _no_params_pattern(pattern):
     yield list(Path().glob(pattern))
 
 
-def _get_param_values(pattern, paths):
-    values = []
-    wildcard_paths = set()
-    parser = parse.compile(pattern)
+# ``**/`` spans any number of directories, classes never match the separator
+_WILDCARDS = re.compile(r'(\*\*/|\*\*|\*|\?|\[!?\]?[^\]/]*\])')
+# windows paths are case insensitive, posix ones aren't
+_CASE_FLAGS = re.IGNORECASE if os.path.normcase('A') == 'a' else 0
 
-    for path in paths:
-        result = parser.parse(str(path))
-        wildcard_paths.add(result.fixed)
-        values.append(result.named)
 
-    return values, wildcard_paths
+def _pattern_tokens(pattern):
+    """
+    Splits the pattern into ``(kind, value)`` tokens, kind is one of literal, ``*``, ``**``, ``**/``, ``?``,
+    ``[`` with the character class as value or param.
+    """
+    tokens = []
+    for literal, field, _, _ in Formatter().parse(pattern):
+        for part in _WILDCARDS.split(literal):
+            if part in ('*', '**', '**/', '?'):
+                tokens.append((part, None))
+            elif len(part) > 2 and part.startswith('[') and part.endswith(']'):
+                tokens.append(('[', part))
+            elif part:
+                tokens.append(('literal', part))
+        if field:
+            tokens.append(('param', field))
+    return tokens
 
 
-def _params_pattern(pattern, params, **kwargs):
-    files = defaultdict(list)
+def _wildcard_regex(kind, value):
+    # same as in glob ``**/`` matches zero or more directories, the others stay within a single name
+    if kind == '[':
+        negate = value.startswith('[!')
+        chars = value[2 if negate else 1:-1].replace('\\', '\\\\').replace('[', '\\[')
+        if chars.startswith('^'):
+            chars = '\\' + chars
+        return '[%s%s]' % ('^/' if negate else '', chars)
+    return {'*': '[^/]*?', '**': '.+?', '**/': '(?:[^/]+/)*?', '?': '[^/]'}[kind]
 
-    # change parameters for wildcards so we can use it in glob
-    wildcard_params = {k: '*' for k in params}
-    wildcard_pattern = pattern.format(**wildcard_params)
-    if Path(wildcard_pattern).is_absolute():
-        rel_wildcard_pattern = str(Path(wildcard_pattern).relative_to('/'))
-        paths = list(Path('/').glob(rel_wildcard_pattern))
-    else:
-        paths = list(Path().glob(wildcard_pattern))
 
-    # get all available values for params and wildcards
-    parse_pattern = pattern.replace('**', '{}').replace('*', '{}')
-    param_values, wildcard_paths = _get_param_values(parse_pattern, paths)
+def _pattern_regex(tokens):
+    """
+    Regex matching whole paths with wildcards in groups ``w0, w1, ...`` and parameters in groups ``p0, p1, ...``,
+    a repeated parameter must have the same value everywhere. Case is ignored only where ``glob`` ignores it too.
+    """
+    parts = []
+    param_groups = {}
+    wildcards = 0
+    for kind, value in tokens:
+        if kind == 'literal':
+            parts.append(re.escape(value))
+        elif kind == 'param' and value in param_groups:
+            parts.append('(?P=%s)' % param_groups[value])
+        elif kind == 'param':
+            param_groups[value] = 'p%d' % len(param_groups)
+            parts.append('(?P<%s>[^/]+?)' % param_groups[value])
+        else:
+            parts.append('(?P<w%d>%s)' % (wildcards, _wildcard_regex(kind, value)))
+            wildcards += 1
+    return re.compile(''.join(parts) + r'\Z', _CASE_FLAGS), wildcards, param_groups
 
-    for wildcard_path in wildcard_paths:
-        base_path = Path(parse_pattern.format(*wildcard_path, **kwargs))
-        for values in param_values:
-            other_path = Path(parse_pattern.format(*wildcard_path, **values))
-            if other_path != base_path and other_path not in files[base_path]:
-                files[base_path].append(other_path)
 
-    for k, v in files.items():
-        result = list(v)
-        result.insert(0, k)
-        yield result
+def _pattern_root(tokens):
+    """
+    Returns the directory in front of the first wildcard or parameter and the number of path levels below it,
+    None when the pattern goes through any number of levels.
+    """
+    prefix = ''
+    for index, (kind, value) in enumerate(tokens):
+        if kind != 'literal':
+            break
+        prefix += value
+    separator = prefix.rfind('/')
+    root = prefix[:separator] if separator > 0 else prefix[:separator + 1]
+    rest = [prefix[separator + 1:]] + [value or kind for kind, value in tokens[index:]]
+    if any(kind in ('**', '**/') for kind, _ in tokens[index:]):
+        return root, None
+    return root, ''.join(rest).count('/') + 1
+
+
+def _walk(root, max_depth):
+    """
+    Yields paths of the files and directories under ``root``, ``max_depth`` levels deep at most.
+    """
+    directories = [(root, 1)]
+    while directories:
+        directory, depth = directories.pop()
+        try:
+            entries = list(os.scandir(directory or '.'))
+        except OSError:
+            continue
+        for entry in entries:
+            # patterns use / on every platform
+            path = entry.path.replace(os.sep, '/') if directory else entry.name
+            yield path
+            # like glob, ** doesn't follow symlinks to directories
+            if (max_depth is None or depth < max_depth) and entry.is_dir(follow_symlinks=max_depth is not None):
+                directories.append((path, depth + 1))
 
 
-def files(pattern, **kwargs):
+def _path_template(tokens, param_groups):
+    """
+    ``str.format`` template of the path taking the wildcard values followed by the parameter values.
+    """
+    parts = []
+    wildcards = sum(1 for kind, _ in tokens if kind not in ('literal', 'param'))
+    wildcard = 0
+    for kind, value in tokens:
+        if kind == 'literal':
+            parts.append(value.replace('{', '{{').replace('}', '}}'))
+        elif kind == 'param':
+            parts.append('{%d}' % (wildcards + list(param_groups).index(value)))
+        else:
+            parts.append('{%d}' % wildcard)
+            wildcard += 1
+    return ''.join(parts)
+
+
+def _params_pattern(pattern, params, missing='keep', **kwargs):
+    tokens = _pattern_tokens(pattern)
+    regex, wildcards, param_groups = _pattern_regex(tokens)
+    root, max_depth = _pattern_root(tokens)
+    template = _path_template(tokens, param_groups)
+
+    # every file is matched once, the values of the wildcards and the parameters are indexed separately
+    wildcard_paths = {}
+    param_values = {}
+    existing = set()
+    for path in _walk(root, max_depth):
+        match = regex.match(path)
+        if match is None:
+            continue
+        wildcard_path = tuple(match.group('w%d' % i) for i in range(wildcards))
+        values = tuple(match.group(group) for group in param_groups.values())
+        wildcard_paths[wildcard_path] = None
+        param_values[values] = None
+        existing.add((wildcard_path, values))
+
+    # every combination of wildcards is paired with all parameter values found in any file
+    base_values = tuple(str(kwargs[name]) for name in param_groups)
+    other_values = [values for values in sorted(param_values) if values != base_values]
+    if not other_values:
+        return
+    for wildcard_path in sorted(wildcard_paths):
+        row_values = [base_values] + other_values
+        if missing != 'keep':
+            # the walk already found every existing file, no need to check the paths again
+            present = [values for values in row_values if (wildcard_path, values) in existing]
+            if callable(missing) and len(present) < len(row_values):
+                absent = [values for values in row_values if (wildcard_path, values) not in existing]
+                missing(Path(template.format(*wildcard_path, *base_values)),
+                        [Path(template.format(*wildcard_path, *values)) for values in absent])
+            if len(present) < 2 or present[0] != base_values:
+                continue
+            row_values = present
+        yield [Path(template.format(*wildcard_path, *values)) for values in row_values]
+
+
+def files(pattern, missing='keep', **kwargs):
     """
     Return list of list of `Path <https://docs.python.org/3/library/pathlib.html#pathlib.Path>`_ to
     files matching the pattern.
@@ -81,6 +232,11 @@ def files(pattern, **kwargs):
     You need to pass a default parameter value for every parameter, path with the default will become the first
     Path in the list.
 
+    Rows are generated lazily once the files matching the pattern are found. Every row has a path for all values
+    of the parameters, even if the file doesn't exist. With ``missing='drop'`` only existing files are kept and
+    rows without the default file or any other file are skipped. ``missing`` can also be a callable, it's called
+    with the default path and the list of missing paths of every incomplete row before they are dropped.
+
     Examples:
 
     explicit pattern: 'path/to/file.txt' will resolve [[Path(path/to/file.txt)]]
@@ -90,12 +246,14 @@ def files(pattern, **kwargs):
     parameter wildcard pattern, default name=file1: 'path/*/{name}.txt' will resolve
     [[Path(path/to1/file1.txt), Path(path/to1/file2.txt)], [Path(path/to2/file1.txt), Path(path/to2/file2.txt)]]
     """
+    if missing not in ('keep', 'drop') and not callable(missing):
+        raise ValueError('missing has to be keep, drop or a callable, got {}'.format(missing))
     # extract named parameters from the pattern
     params = set([p for p in map(lambda e: e[1], Formatter().parse(pattern)) if p])
     if params:
         if len(params - kwargs.keys()) > 0:
             raise ValueError('missing parameters {} for pattern {}'.format(params - kwargs.keys(), pattern))
-        return _params_pattern(pattern, params, **kwargs)
+        return _params_pattern(pattern, params, missing, **kwargs)
     else:
         return _no_params_pattern(pattern)
 
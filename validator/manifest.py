@@ -0,0 +1,77 @@
+import os
+import json
+import pickle
+import hashlib
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def describe(obj):
+    """
+    Returns a json serializable description of the object's configuration.
+    """
+    if isinstance(obj, type):
+        return '{}.{}'.format(obj.__module__, obj.__qualname__)
+    if isinstance(obj, (list, tuple)):
+        return [describe(item) for item in obj]
+    if isinstance(obj, dict):
+        return {str(key): describe(value) for key, value in obj.items()}
+    if hasattr(obj, '__dict__'):
+        # objects drop their caches from the pickled state, they don't change the configuration either
+        state = obj.__getstate__() if hasattr(obj, '__getstate__') else None
+        return [describe(type(obj)), describe(vars(obj) if state is None else state)]
+    return repr(obj)
+
+
+def digest(content):
+    return hashlib.sha1(str(content).encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+class Manifest(object):
+    """
+    Errors of the previous run for every (base, other) pair together with the digest of both files.
+
+    Results are grouped by the configuration of the check and the parser, changing either of them starts
+    from scratch. Groups which weren't used in the last run are dropped when the manifest is saved.
+    """
+    version = 2
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._groups = self._load()
+        self._used = set()
+
+    def _load(self):
+        if not self.path.exists():
+            return {}
+        try:
+            with self.path.open('rb') as fp:
+                version, groups = pickle.load(fp)
+        except Exception:
+            logger.warning('%s is not a valid manifest, validating everything', self.path)
+            return {}
+        return groups if version == self.version else {}
+
+    def key(self, check, parser):
+        config = json.dumps(describe([check, parser]), sort_keys=True)
+        return hashlib.sha1(config.encode('utf-8')).hexdigest()
+
+    def results(self, key):
+        """
+        Returns a dict of (base, other) pair to a tuple of digest and errors.
+        """
+        self._used.add(key)
+        return self._groups.get(key, {})
+
+    def update(self, key, results):
+        self._used.add(key)
+        self._groups[key] = results
+
+    def save(self):
+        groups = {key: results for key, results in self._groups.items() if key in self._used}
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with tmp_path.open('wb') as fp:
+            pickle.dump((self.version, groups), fp)
+        os.replace(str(tmp_path), str(self.path))
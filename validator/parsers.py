@@ -1,7 +1,20 @@
-import markdown
+import os
+import sys
+import re
+import mmap
+import logging
+import threading
 import xml.etree.ElementTree as ET
+from io import BytesIO
+from collections import deque, Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from lxml import etree
 
 from .fs import read_content
+from .render import markdown
+
+logger = logging.getLogger(__name__)
 
 
 class ParserError(Exception):
@@ -14,6 +27,96 @@ class FileReader(object):
         return read_content(path)
 
 
+class BulkFileReader(object):
+    """
+    Reads files as utf-8, decoding errors are handled according to ``errors`` same as in ``bytes.decode``. Files
+    of at least ``mmap_threshold`` bytes are memory mapped instead of read into a buffer first.
+
+    Files of the rows passed through ``prefetch`` are read ahead on ``workers`` threads while the checks work on
+    the previous rows, at most ``buffer_size`` files are waiting to be read by the checks at a time.
+    """
+
+    def __init__(self, workers=4, buffer_size=64, mmap_threshold=1024 * 1024, errors='strict'):
+        self.workers = workers
+        self.buffer_size = buffer_size
+        self.mmap_threshold = mmap_threshold
+        self.errors = errors
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pending'] = {}
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _read_file(self, path):
+        try:
+            with open(str(path), 'rb') as fp:
+                if os.fstat(fp.fileno()).st_size >= self.mmap_threshold:
+                    with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        content = str(mapped, 'utf-8', self.errors)
+                else:
+                    content = fp.read().decode('utf-8', self.errors)
+        except FileNotFoundError:
+            logger.warning('%s does not exist', os.path.abspath(str(path)))
+            return ''
+        if '\r' in content:
+            # same newlines as a file opened in text mode
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        return content
+
+    def read(self, path):
+        with self._lock:
+            future = self._pending.pop(path, None)
+        if future is not None:
+            return future.result()
+        return self._read_file(path)
+
+    def _submit(self, executor, row):
+        with self._lock:
+            for path in row:
+                if path not in self._pending:
+                    self._pending[path] = executor.submit(self._read_file, path)
+
+    def _release(self, queued, references):
+        row = queued.popleft()
+        yield row
+        # the row is done once the next one is requested, files it didn't read are dropped
+        references.subtract(row)
+        with self._lock:
+            for path in row:
+                if references[path] <= 0 and path in self._pending:
+                    self._pending.pop(path).cancel()
+
+    def prefetch(self, rows):
+        """
+        Yields the rows while the files of the following rows are read in the background.
+        """
+        queued = deque()
+        references = Counter()
+        with ThreadPoolExecutor(self.workers) as executor:
+            try:
+                for row in rows:
+                    row = list(row)
+                    self._submit(executor, row)
+                    queued.append(row)
+                    references.update(row)
+                    while queued and len(self._pending) >= self.buffer_size:
+                        yield from self._release(queued, references)
+                while queued:
+                    yield from self._release(queued, references)
+            finally:
+                with self._lock:
+                    for future in self._pending.values():
+                        future.cancel()
+                    self._pending.clear()
+
+
 class TxtReader(object):
     def read(self, content):
         return content
@@ -21,21 +124,166 @@ class TxtReader(object):
 
 class MarkdownParser(object):
     def parse(self, content):
-        return markdown.markdown(content)
+        return markdown(content)
+
+
+class Entries(OrderedDict):
+    """
+    Texts of xml elements keyed by an attribute of the elements, see ``XmlParser``. Parsers following in a
+    ``ChainParser`` parse every text on its own, as a string the texts are joined same as without the key.
+    """
+
+    def map(self, function):
+        return Entries((name, function(text)) for name, text in self.items())
+
+    def __str__(self):
+        return '\n\n'.join(self.values())
+
+    def __sizeof__(self):
+        return super().__sizeof__() + sum(sys.getsizeof(name) + sys.getsizeof(text) for name, text in self.items())
+
+
+def _item(element, key):
+    if element.text is None:
+        return None
+    return element.get(key) if key is not None else None, element.text
+
+
+def _xml_content(items, key):
+    """
+    Joins the texts of ``(name, text)`` items or, with a ``key``, returns them as entries. Elements without the
+    key attribute are paired by their position, repeated names get the number of the repetition appended
+    (``name#2``) so every element is kept and paired with the same repetition in the other file.
+    """
+    if key is None:
+        return '\n\n'.join(text.strip() for _, text in items)
+    entries = Entries()
+    seen = Counter()
+    for index, (name, text) in enumerate(items):
+        if name is None:
+            name = '#{}'.format(index)
+        else:
+            seen[name] += 1
+            if seen[name] > 1:
+                name = '{}#{}'.format(name, seen[name])
+        entries[name] = text.strip()
+    return entries
 
 
 class XmlParser(object):
-    def __init__(self, query='*'):
+    """
+    Joins the texts of the elements matching ``query``. With ``key`` the texts are returned as ``Entries`` keyed by
+    the ``key`` attribute of the elements so the checks compare the elements of the same name one by one.
+    """
+
+    def __init__(self, query='*', key=None):
         self.query = query
+        self.key = key
 
     def parse(self, content):
         content = content.strip()
         if not content:
-            return ''
+            return _xml_content([], self.key)
         elements = ET.fromstring(content).findall(self.query)
-        text_elements = filter(lambda el: el.text is not None, elements)
-        texts = map(lambda el: el.text.strip(), text_elements)
-        return '\n\n'.join(texts)
+        items = [_item(element, self.key) for element in elements]
+        return _xml_content([item for item in items if item is not None], self.key)
+
+
+class _RefuseExternal(etree.Resolver):
+    """
+    Fails on every external entity or dtd instead of loading it, like ``xml.etree`` does.
+    """
+
+    def resolve(self, url, pubid, context):
+        raise ParserError('external entity {} is not allowed'.format(url))
+
+
+class LxmlXmlParser(object):
+    """
+    Extracts the same texts as ``XmlParser`` with lxml. The query is compiled once as an XPath evaluated from the
+    root element, simple ElementPath queries like ``*``, ``string`` or ``.//string`` are valid XPath as well.
+
+    Queries selecting elements by tag (``*``, ``tag``, ``.//*`` or ``.//tag``) don't build the whole tree, the
+    document is parsed incrementally and every element is dropped as soon as its text is taken.
+    """
+    _streamed_query = re.compile(r'^(?P<descendants>\.//)?(?P<tag>\*|[^\s/\[\]()@:*]+)$')
+    # internal entities are expanded like in xml.etree, older lxml can't tell them apart from external ones so
+    # everything is resolved there and the resolver refuses to load the external ones, local files included
+    _resolve_entities = 'internal' if etree.LXML_VERSION >= (5,) else True
+
+    def __init__(self, query='*', key=None, streaming=True):
+        self.query = query
+        self.key = key
+        self.streaming = streaming
+        self._compile()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_xpath']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile()
+
+    def _compile(self):
+        self._xpath = etree.XPath(self.query)
+        match = self._streamed_query.match(self.query) if self.streaming else None
+        self._descendants = bool(match and match.group('descendants'))
+        self._tag = match.group('tag') if match else None
+
+    def _parser_kwargs(self):
+        # the content is already decoded, the encoding declared in the document doesn't apply anymore
+        return {'encoding': 'utf-8', 'resolve_entities': self._resolve_entities, 'no_network': True}
+
+    def _matches(self, element):
+        parent = element.getparent()
+        if parent is None:
+            return False
+        return self._descendants or parent.getparent() is None
+
+    def _stream(self, content):
+        items = []
+        # children of the root can't be nested, descendants are matched when they start so nested ones keep the
+        # document order, their text is complete only when they end
+        slots = []
+        events = ('start', 'end') if self._descendants else ('end',)
+        tag = None if self._tag == '*' else self._tag
+        elements = etree.iterparse(BytesIO(content.encode('utf-8')), events=events, tag=tag, **self._parser_kwargs())
+        elements.resolvers.add(_RefuseExternal())
+        for event, element in elements:
+            matches = self._matches(element)
+            if event == 'start':
+                if matches:
+                    slots.append(len(items))
+                    items.append(None)
+                continue
+            if element.getparent() is None:
+                continue
+            if matches:
+                item = _item(element, self.key)
+                if self._descendants:
+                    items[slots.pop()] = item
+                else:
+                    items.append(item)
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+        return [item for item in items if item is not None]
+
+    def _select(self, content):
+        parser = etree.XMLParser(**self._parser_kwargs())
+        parser.resolvers.add(_RefuseExternal())
+        root = etree.fromstring(content.encode('utf-8'), parser)
+        items = [_item(element, self.key) for element in self._xpath(root)]
+        return [item for item in items if item is not None]
+
+    def parse(self, content):
+        content = content.strip()
+        if not content:
+            return _xml_content([], self.key)
+        items = self._stream(content) if self._tag is not None else self._select(content)
+        return _xml_content(items, self.key)
 
 
 class CsvParser(object):
@@ -51,7 +299,10 @@ class ChainParser(object):
         original_content = content
         try:
             for parser in self.parsers:
-                content = parser.parse(content)
+                if isinstance(content, Entries):
+                    content = content.map(parser.parse)
+                else:
+                    content = parser.parse(content)
             return content
         except Exception as e:
             msg = 'error in content %s' % original_content
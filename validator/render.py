@@ -0,0 +1,35 @@
+import threading
+from functools import lru_cache
+
+import markdown as markdown_lib
+
+# longer texts are whole documents, they rarely repeat and would take too much memory in the cache
+MEMOIZE_MAX_LENGTH = 4096
+
+_local = threading.local()
+
+
+def _converter():
+    converter = getattr(_local, 'converter', None)
+    if converter is None:
+        converter = _local.converter = markdown_lib.Markdown()
+    return converter
+
+
+def _convert(text):
+    return _converter().reset().convert(text)
+
+
+@lru_cache(maxsize=4096)
+def _memoized(text):
+    return _convert(text)
+
+
+def markdown(text):
+    """
+    Same as ``markdown.markdown`` with the default options. Every thread reuses its own converter instead of
+    setting up a new one for each text and short texts are rendered only once.
+    """
+    if len(text) <= MEMOIZE_MAX_LENGTH:
+        return _memoized(text)
+    return _convert(text)
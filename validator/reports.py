@@ -1,12 +1,50 @@
 from bs4 import BeautifulSoup
+from pathlib import Path
+import os
+import re
+import html
+import json
 import shutil
-import markdown
+import string
+from urllib.parse import quote
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from .fs import save_report
+from .fs import report_path, save_report, remove_stale_reports
+from .render import markdown
 from .errors import UrlDiff, MdDiff, UrlOccurencyDiff
 
 
-class HtmlReporter(object):
+class Reporter(object):
+    """
+    Reporters get errors one at a time through ``report_error`` between ``start`` and ``finish``.
+    """
+
+    def start(self):
+        pass
+
+    def report_error(self, error):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+    def report(self, errors):
+        self.start()
+        for error in errors:
+            self.report_error(error)
+        self.finish()
+
+
+class HtmlReporter(Reporter):
+    """
+    Writes a report for every file with errors. The errors are collected until ``finish`` so all the errors of a
+    file end up in its single report, urls are reported in every file they were found in.
+
+    Every run removes the output directory and writes all the reports again. With ``incremental`` only the reports
+    which changed are written, the reports of files without errors anymore are removed and ``index.html`` links to
+    all the reports, ``_index.html`` if there is a report of a top level ``index`` file.
+    """
     report_template = """
 <!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"
           "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
@@ -78,8 +116,29 @@ class HtmlReporter(object):
 </html>
 """
 
-    def __init__(self, output_directory='errors'):
+    index_template = """<!DOCTYPE html>
+<html>
+<head>
+    <meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
+    <title>Translation errors</title>
+</head>
+<body>
+    <h3>Problems were found in ${count} files</h3>
+    <ul>
+${items}
+    </ul>
+</body>
+</html>
+"""
+    index_item = '        <li><a href="{}">{}</a></li>'
+    # ids of the elements of the report template the content goes to
+    slots = ['left_content', 'right_content', 'left_diff', 'right_diff', 'error_msgs', 'urls']
+
+    def __init__(self, output_directory='errors', incremental=False):
         self.output_directory = output_directory
+        self.incremental = incremental
+        self._errors = OrderedDict()
+        self._reports = []
 
     def _add_content(self, soup, tag_id, content):
         tags = soup.select('#{}'.format(tag_id))
@@ -90,63 +149,252 @@ class HtmlReporter(object):
             print('missing tag: %s, content %s' % (tag_id, content))
         return soup
 
-    # TODO just rewrite !!!
-    # TODO remove isinstance
-    def report(self, errors):
-        shutil.rmtree(self.output_directory, ignore_errors=True)
-        for error in errors:
-            # TODO save to different files for links and diff
-            # TODO use mustache for templates
-            report_soup = BeautifulSoup(self.report_template, 'lxml')
-            if isinstance(error, UrlDiff):
-                messages = ['<span>{} returned with code {}</span>'.format(error.url, error.status_code)]
-                self._add_content(report_soup, 'urls', '\n'.join(messages))
-            if isinstance(error, MdDiff):
-                error_msgs = '<br />'.join(map(lambda i: str(i), error.error_msgs))
-                base = markdown.markdown(error.base.parsed)
-                other = markdown.markdown(error.other.parsed)
-                report_soup = self._add_content(report_soup, 'left_content', BeautifulSoup(base, 'lxml').body)
-                report_soup = self._add_content(report_soup, 'right_content', BeautifulSoup(other, 'lxml').body)
-                report_soup = self._add_content(report_soup, 'left_diff', BeautifulSoup(error.base.diff, 'lxml').body)
-                report_soup = self._add_content(report_soup, 'right_diff', BeautifulSoup(error.other.diff, 'lxml').body)
-                report_soup = self._add_content(report_soup, 'error_msgs', BeautifulSoup(error_msgs, 'lxml').body)
-            save_report(self.output_directory, error.other.original, report_soup.prettify())
-
-
-class ConsoleReporter(object):
+    def start(self):
+        self._errors = OrderedDict()
+        self._reports = []
+        if not self.incremental:
+            shutil.rmtree(self.output_directory, ignore_errors=True)
 
-    def report(self, errors):
+    def _sources(self, error):
+        if isinstance(error, UrlDiff):
+            return list(OrderedDict.fromkeys(error.files))
+        if isinstance(error, UrlOccurencyDiff):
+            return [error.translation_path]
+        return [error.other.original]
+
+    def _error_msgs(self, error_msgs):
+        if isinstance(error_msgs, str):
+            error_msgs = [error_msgs]
+        return '<br />'.join(str(msg) for msg in error_msgs)
+
+    def _html(self, data):
+        return markdown(data.parsed)
+
+    def _fragments(self, error):
+        """
+        Html of the error for every slot of the report it fills.
+        """
+        if isinstance(error, UrlDiff):
+            return {'urls': '<span>{}</span>'.format(html.escape(error.message(), quote=False))}
+        if isinstance(error, UrlOccurencyDiff):
+            return {'error_msgs': self._error_msgs(error.as_dict()['error_msgs'])}
+        if isinstance(error, MdDiff):
+            return {'left_content': self._html(error.base), 'right_content': self._html(error.other),
+                    'left_diff': error.base.diff, 'right_diff': error.other.diff,
+                    'error_msgs': self._error_msgs(error.error_msgs)}
+        return {}
+
+    def _slot_values(self, errors):
+        """
+        Joins the html of all the errors of a report slot by slot, errors of the same content show it only once.
+        """
+        fragments = OrderedDict((slot, OrderedDict()) for slot in self.slots)
         for error in errors:
-            if isinstance(error, UrlDiff):
-                print('{} returned with code {}'.format(error.url, error.status_code))
-                for path in error.files:
-                    print('\t{}'.format(str(path)))
-                print()
-            if isinstance(error, MdDiff):
-                print('Files are different:\n\t{}\n\t{}\n\n'.format(str(error.base), str(error.other)))
+            for slot, fragment in self._fragments(error).items():
+                if fragment:
+                    fragments[slot][fragment] = None
+        return {slot: ('<br />\n' if slot == 'error_msgs' else '\n').join(values) for slot, values in fragments.items()}
+
+    def render(self, *errors):
+        report_soup = BeautifulSoup(self.report_template, 'lxml')
+        for slot, content in self._slot_values(errors).items():
+            if content:
+                self._add_content(report_soup, slot, BeautifulSoup(content, 'lxml').body)
+        return report_soup.prettify()
+
+    def _save(self, source_path, report):
+        return str(source_path), save_report(self.output_directory, source_path, report, self.incremental)
+
+    def _write(self, source_path, errors):
+        return self._save(source_path, self.render(*errors))
+
+    def _write_reports(self, groups):
+        return [self._write(source_path, errors) for source_path, errors in groups]
+
+    def _index(self):
+        items = [self.index_item.format(quote(Path(os.path.relpath(str(path), self.output_directory)).as_posix()),
+                                        html.escape(source))
+                 for source, path in sorted(self._reports, key=lambda report: str(report[1]))]
+        return string.Template(self.index_template).substitute(count=len(items), items='\n'.join(items))
+
+    def finish(self):
+        groups, self._errors = list(self._errors.values()), OrderedDict()
+        self._reports = self._write_reports(groups)
+        if not self.incremental:
+            return
+        # the report of a top level index file keeps its name, the index moves aside
+        paths = [path for _, path in self._reports]
+        index_name = 'index'
+        while report_path(self.output_directory, index_name) in paths:
+            index_name = '_' + index_name
+        index_path = save_report(self.output_directory, index_name, self._index(), incremental=True)
+        remove_stale_reports(self.output_directory, paths + [index_path])
+
+    def report_error(self, error):
+        # files with the same report path, e.g. a.md and a.txt, share the report
+        for source_path in self._sources(error):
+            path = report_path(self.output_directory, source_path)
+            self._errors.setdefault(path, (source_path, []))[1].append(error)
+
+
+class TemplateHtmlReporter(HtmlReporter):
+    """
+    Writes the same reports as ``HtmlReporter`` without parsing any html. The template is compiled once with a
+    placeholder in every element the content goes to, the html rendered by the checks is filled in by string
+    substitution and the reports are rendered and written by ``workers`` threads, one thread per report.
+
+    Unlike ``HtmlReporter`` the report isn't reformatted and error messages are escaped instead of parsed as html.
+    """
+
+    def __init__(self, output_directory='errors', workers=4, incremental=False):
+        super().__init__(output_directory, incremental)
+        self.workers = workers
+        self._template = self._compile(self.report_template)
+
+    def _compile(self, template):
+        template = template.replace('$', '$$')
+        # the reports are written as utf-8, BeautifulSoup updates the declared charset the same way
+        template = re.sub(r'charset=[\w-]+', 'charset=utf-8', template)
+        for slot in self.slots:
+            template = re.sub(r'(<(\w+) id="{}"[^>]*>)(</\2>)'.format(slot), r'\1${{{}}}\3'.format(slot), template)
+        return string.Template(template)
 
+    def _html(self, data):
+        return data.html or markdown(data.parsed)
 
-class StoreReporter(object):
+    def _error_msgs(self, error_msgs):
+        if isinstance(error_msgs, str):
+            error_msgs = [error_msgs]
+        return '<br />'.join(html.escape(str(msg), quote=False) for msg in error_msgs)
+
+    def render(self, *errors):
+        return self._template.substitute(self._slot_values(errors))
+
+    def _write_reports(self, groups):
+        # all the errors of a report are in one group, every file is written by a single thread
+        with ThreadPoolExecutor(self.workers) as executor:
+            return list(executor.map(lambda group: self._write(*group), groups))
+
+
+class ConsoleReporter(Reporter):
+
+    def report_error(self, error):
+        if isinstance(error, UrlDiff):
+            print(error.message())
+            for path in error.files:
+                print('\t{}'.format(str(path)))
+            print()
+        if isinstance(error, MdDiff):
+            print('Files are different:\n\t{}\n\t{}\n\n'.format(str(error.base), str(error.other)))
+
+
+class StoreReporter(Reporter):
 
     def __init__(self):
         self.log = []
 
-    def report(self, errors):
-        for error in errors:
-            if isinstance(error, UrlDiff):
-                self.log.append('%s returned with code %s for files' % (error.url, error.status_code))
-                for path in error.files:
-                    self.log.append('\t%s' % str(path))
-            if isinstance(error, MdDiff):
-                self.log.append('Files are different:\n\t%s\n\t%s\n\n' % (str(error.base), str(error.other)))
-            if isinstance(error, UrlOccurencyDiff):
-                self.log.append('Count of URLS in %s and %s are different' % (error.base_path, error.translation_path))
+    def report_error(self, error):
+        if isinstance(error, UrlDiff):
+            self.log.append('%s for files' % error.message())
+            for path in error.files:
+                self.log.append('\t%s' % str(path))
+        if isinstance(error, MdDiff):
+            self.log.append('Files are different:\n\t%s\n\t%s\n\n' % (str(error.base), str(error.other)))
+        if isinstance(error, UrlOccurencyDiff):
+            self.log.append('Count of URLS in %s and %s are different' % (error.base_path, error.translation_path))
+
+
+class StreamReporter(Reporter):
+    """
+    Writes every error to ``output`` as soon as it's reported. The output is a path, the file is opened on
+    ``start`` and closed on ``finish``, or an already open text file which is only flushed.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self._fp = None
+
+    def header(self):
+        return ''
+
+    def format_error(self, error):
+        raise NotImplementedError
+
+    def footer(self):
+        return ''
+
+    def _write(self, text):
+        if text:
+            self._fp.write(text)
+            self._fp.flush()
+
+    def start(self):
+        self._fp = self.output if hasattr(self.output, 'write') else open(str(self.output), 'w', encoding='utf-8')
+        self._write(self.header())
+
+    def report_error(self, error):
+        self._write(self.format_error(error))
 
+    def finish(self):
+        self._write(self.footer())
+        if self._fp is not self.output:
+            self._fp.close()
+        self._fp = None
 
-class ChainReporter(object):
+
+class JsonLinesReporter(StreamReporter):
+    """
+    Writes every error as a json object on its own line, the fields are described by the ``as_dict`` of the errors.
+    """
+
+    def format_error(self, error):
+        return json.dumps(error.as_dict(), sort_keys=True) + '\n'
+
+
+# characters which aren't allowed in xml 1.0 documents
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def _xml_text(text, quote=True):
+    return html.escape(_XML_INVALID.sub('', str(text)), quote=quote)
+
+
+class JUnitReporter(StreamReporter):
+    """
+    Writes every error as a failed test case of a single test suite. The suite is written before the number of
+    errors is known, so its counts are left out. Files without errors have no test cases.
+    """
+    suite_name = 'validator'
+
+    def header(self):
+        return '<?xml version="1.0" encoding="utf-8"?>\n<testsuites>\n<testsuite name="{}">\n'.format(
+            _xml_text(self.suite_name))
+
+    def format_error(self, error):
+        fields = error.as_dict()
+        name = fields.get('url') or fields['files'][-1]
+        details = '\n'.join(fields['error_msgs'] + fields['files'])
+        return ('<testcase classname="{}.{}" name="{}"><failure message="{}" type="{}">{}</failure></testcase>\n'
+                .format(_xml_text(self.suite_name), _xml_text(fields['kind']), _xml_text(name),
+                        _xml_text('; '.join(fields['error_msgs'])), _xml_text(fields['kind']),
+                        _xml_text(details, quote=False)))
+
+    def footer(self):
+        return '</testsuite>\n</testsuites>\n'
+
+
+class ChainReporter(Reporter):
     def __init__(self, reporters):
         self.reporters = reporters
 
-    def report(self, errors):
+    def start(self):
+        for reporter in self.reporters:
+            reporter.start()
+
+    def report_error(self, error):
+        for reporter in self.reporters:
+            reporter.report_error(error)
+
+    def finish(self):
         for reporter in self.reporters:
-            reporter.report(errors)
+            reporter.finish()
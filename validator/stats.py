@@ -0,0 +1,130 @@
+import json
+import heapq
+import threading
+from time import perf_counter
+from collections import Counter
+
+
+class _NoTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NO_TIMER = _NoTimer()
+
+
+def timer(stats, name, key=None):
+    """
+    Times the ``with`` block when ``stats`` are enabled, does nothing otherwise.
+    """
+    if stats is None:
+        return NO_TIMER
+    return stats.timer(name, key)
+
+
+def increment(stats, name, value=1):
+    if stats is not None:
+        stats.increment(name, value)
+
+
+def _describe_key(key, max_length=200):
+    # texts checked without files are their own keys
+    key = str(key)
+    return key if len(key) <= max_length else key[:max_length] + '...'
+
+
+class _Timer(object):
+    def __init__(self, stats, name, key):
+        self.stats = stats
+        self.name = name
+        self.key = key
+        self.start = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.add_time(self.name, perf_counter() - self.start, self.key)
+        return False
+
+
+class Stats(object):
+    """
+    Wall time and number of calls of every stage of the validation together with counters like bytes read or
+    cache hits. For timers with a key (a file or a url) the ``slowest`` keys are kept as well.
+
+    Checks running in worker processes (``CheckBuilder.parallel``) are only timed as a whole. With ``path`` the
+    stats are saved as json when the validation finishes.
+    """
+
+    def __init__(self, slowest=10, path=None):
+        self.slowest = slowest
+        self.path = path
+        self.timers = {}
+        self.counters = Counter()
+        self._slowest = {}
+        self._lock = threading.Lock()
+
+    def timer(self, name, key=None):
+        return _Timer(self, name, key)
+
+    def add_time(self, name, seconds, key=None):
+        with self._lock:
+            calls, total = self.timers.get(name, (0, 0.0))
+            self.timers[name] = (calls + 1, total + seconds)
+            if key is not None and self.slowest:
+                slowest = self._slowest.setdefault(name, [])
+                if len(slowest) < self.slowest:
+                    heapq.heappush(slowest, (seconds, _describe_key(key)))
+                elif seconds > slowest[0][0]:
+                    heapq.heapreplace(slowest, (seconds, _describe_key(key)))
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def iter(self, name, iterable, counter=None):
+        """
+        Yields from ``iterable`` and records the time spent producing the items as a single call.
+        """
+        seconds = 0.0
+        iterator = iter(iterable)
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += perf_counter() - start
+                if counter is not None:
+                    self.increment(counter)
+                yield item
+        finally:
+            self.add_time(name, seconds)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'timers': {
+                    name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in self.timers.items()
+                },
+                'counters': dict(self.counters),
+                'slowest': {
+                    name: [{'key': key, 'seconds': seconds} for seconds, key in sorted(items, reverse=True)]
+                    for name, items in self._slowest.items()
+                },
+            }
+
+    def dump(self, path=None):
+        with open(str(path or self.path), 'w') as fp:
+            json.dump(self.as_dict(), fp, indent=2, sort_keys=True)
+
+    def finish(self):
+        if self.path is not None:
+            self.dump()